@@ -15,6 +15,7 @@
 import unittest
 import sys
 from inspect import stack
+from itertools import permutations
 from os.path import abspath, dirname, pardir, join
 
 # prevent python from writing *.pyc files / __pycache__ folders
@@ -28,6 +29,7 @@ if path_app not in sys.path:
     sys.path += [path_tests, path_app]
     
 import controller
+from networks import graph, network
 from PyQt5.QtWidgets import QApplication
 from autonomous_system.AS_operations import ASCreation
 from graph_generation.graph_dimension import GraphDimensionWindow
@@ -39,11 +41,22 @@ from ip_networks.routing_table import RoutingTable
 from ip_networks.switching_table import SwitchingTable
 # from ip_networks.troubleshooting import Troubleshooting
 
+# a single QApplication is shared by all tests: creating one per test is slow,
+# and Qt does not support several QApplication instances in one process
+app = QApplication.instance() or QApplication(sys.argv)
+
 def start_pyNMS(function):
     def wrapper(self):
-        self.app = QApplication(sys.argv)
-        self.ct = controller.Controller(path_app, test=True)
-        self.pj = self.ct.current_project
+        self.app = app
+        # the controller (windows, menus, pixmaps) is created once per test
+        # class: each test then works on a new project, so that it starts
+        # with an empty network
+        cls = type(self)
+        if 'ct' not in cls.__dict__:
+            cls.ct = controller.Controller(path_app, test=True)
+            self.pj = cls.ct.current_project
+        else:
+            self.pj = cls.ct.add_project()
         self.vw = self.pj.current_view
         self.nk = self.vw.network
         function(self)
@@ -70,12 +83,9 @@ class TestObjectCreation(unittest.TestCase):
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_object_creation(self):
         self.assertEqual(len(self.nk.nodes), 11)
-        self.assertEqual(len(list(self.nk.all_links())), 17)  
+        self.assertEqual(self.nk.link_count, 17)  
 
 # class TestExportImport(unittest.TestCase):
 #     
@@ -118,11 +128,8 @@ class TestFlow(unittest.TestCase):
  
     @start_pyNMS_and_import_project('test_flow1.xls')
     def setUp(self):
-        self.source = self.nk.pn['node'][self.nk.name_to_id['s']]
-        self.target = self.nk.pn['node'][self.nk.name_to_id['t']]
- 
-    def tearDown(self):
-        self.app.quit()
+        self.source = self.nk.node_by_name('s')
+        self.target = self.nk.node_by_name('t')
  
     def test_ford_fulkerson(self):
         ff_flow = self.nk.ford_fulkerson(self.source, self.target)
@@ -135,6 +142,13 @@ class TestFlow(unittest.TestCase):
     def test_dinic(self):
         _, dinic_flow = self.nk.dinic(self.source, self.target)
         self.assertEqual(dinic_flow, 19)  
+        
+    def test_auto_flow(self):
+        for algo in ('auto', 'dinic', 'edmonds-karp'):
+            flow = self.nk.max_flow(self.source, self.target, algo)
+            self.assertEqual(flow, 19)
+        with self.assertRaises(ValueError):
+            self.nk.max_flow(self.source, self.target, 'dinics')
     
     def test_LP_flow(self):
         LP_flow = self.nk.LP_MF_formulation(self.source, self.target)
@@ -146,14 +160,98 @@ class TestMST(unittest.TestCase):
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_kruskal(self):
         mst = self.nk.kruskal(self.nk.pn['node'].values())
         mst_costs = set(map(lambda plink: plink.costSD, mst))
         self.assertEqual(mst_costs, {1, 2, 4})
         
+    def test_kruskal_heap(self):
+        # both sorting methods must result in the same spanning tree cost
+        nodes = self.nk.pn['node'].values()
+        mst_array = list(self.nk.kruskal(nodes, sort_method='array'))
+        mst_heap = list(self.nk.kruskal(nodes, sort_method='heap'))
+        cost = lambda mst: sum(map(lambda plink: plink.costSD, mst))
+        self.assertEqual(len(mst_heap), len(mst_array))
+        self.assertEqual(cost(mst_heap), cost(mst_array))
+        with self.assertRaises(ValueError):
+            list(self.nk.kruskal(nodes, sort_method='heaps'))
+        
+    def test_kruskal_full_mesh(self):
+        # in a full-mesh, most physical links are never needed: kruskal stops
+        # as soon as the spanning tree is complete
+        objects = set(self.nk.full_mesh(8, 'router'))
+        nodes = set(filter(lambda obj: obj.class_type == 'node', objects))
+        for sort_method in ('array', 'heap'):
+            mst = list(self.nk.kruskal(nodes, sort_method=sort_method))
+            self.assertEqual(len(mst), len(nodes) - 1)
+        
+    def test_kruskal_square_tiling(self):
+        # a spanning tree of a connected graph has exactly one physical link
+        # less than the number of nodes, whatever the order of the unions
+        objects = set(self.nk.square_tiling(15, 'router'))
+        nodes = set(filter(lambda obj: obj.class_type == 'node', objects))
+        mst = list(self.nk.kruskal(nodes))
+        self.assertEqual(len(nodes), 225)
+        self.assertEqual(len(mst), len(nodes) - 1)
+        
+class TestConnectivity(unittest.TestCase):
+    
+    @start_pyNMS
+    def setUp(self):
+        # two disconnected graphs, of 9 and 5 nodes, and an isolated node
+        # (the square tiling comes first, as its node names start from 0)
+        list(self.nk.square_tiling(3, 'router'))
+        list(self.nk.full_mesh(5, 'router'))
+        self.nk.nf(name='isolated node')
+        
+    def test_connected_components(self):
+        # the scipy and the pure python implementations must agree
+        for scipy_available in (True, False):
+            graph.scipy_available = scipy_available
+            components = list(self.nk.connected_components())
+            self.assertEqual(sorted(map(len, components)), [1, 5, 9])
+        graph.scipy_available = True
+            
+    def test_bfs(self):
+        isolated_node = self.nk.node_by_name('isolated node')
+        for scipy_available in (True, False):
+            graph.scipy_available = scipy_available
+            self.assertEqual(list(self.nk.bfs(isolated_node)), [])
+            for component in self.nk.connected_components():
+                source = component.pop()
+                self.assertEqual(set(self.nk.bfs(source)), component)
+        graph.scipy_available = True
+
+class TestSegment(unittest.TestCase):
+
+    @start_pyNMS
+    def setUp(self):
+        # three routers connected through two switches (router2 is attached
+        # to both switches), and router3 directly connected to router2
+        switch1 = self.nk.nf(subtype='switch', name='switch1')
+        switch2 = self.nk.nf(subtype='switch', name='switch2')
+        routers = [self.nk.nf(name='router' + str(i)) for i in range(4)]
+        for source, destination in (
+                                    (routers[0], switch1),
+                                    (routers[1], switch2),
+                                    (routers[2], switch1),
+                                    (routers[2], switch2),
+                                    (switch1, switch2),
+                                    (routers[2], routers[3])
+                                    ):
+            self.nk.lf(source=source, destination=destination)
+
+    def test_segment_finder(self):
+        self.nk.segment_finder(3)
+        segments = sorted(
+                          sorted(str(node) for _, node in segment)
+                          for segment in self.nk.ma_segments[3]
+                          )
+        self.assertEqual(segments, [
+                                    ['router0', 'router1', 'router2'],
+                                    ['router2', 'router3']
+                                    ])
+
 class TestSP(unittest.TestCase):
     
     results = (
@@ -164,37 +262,120 @@ class TestSP(unittest.TestCase):
  
     @start_pyNMS_and_import_project('test_SP.xls')
     def setUp(self):
-        get_node = lambda node_name: self.nk.pn['node'][self.nk.name_to_id[node_name]]
+        get_node = self.nk.node_by_name
         self.route9 = (get_node('node0'), get_node('node4'))
         self.route10 = (get_node('node0'), get_node('node5'))
         self.route11 = (get_node('node0'), get_node('node3'))
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_A_star(self):
         for i, r in enumerate((self.route9, self.route10, self.route11)):
             _, path = self.nk.A_star(r[0], r[1])
             self.assertEqual(list(map(str, path)), self.results[i])
+            
+    def test_dijkstra(self):
+        for i, r in enumerate((self.route9, self.route10, self.route11)):
+            _, path, _ = self.nk.dijkstra(r[0], r[1])
+            self.assertEqual(list(map(str, path)), self.results[i])
         
     def test_bellman_ford(self):
         for i, r in enumerate((self.route9, self.route10, self.route11)):
             _, path = self.nk.bellman_ford(r[0], r[1])
             self.assertEqual(list(map(str, path)), self.results[i])
+
+    def test_bellman_ford_parallel_plinks(self):
+        # a node lowered once per parallel physical link must not be taken
+        # for a negative cycle. The costs are rotated over the physical
+        # links, so that the scan order of the parallel physical links does
+        # not matter: the cheapest one comes last in at least one rotation.
+        source, target = self.nk.nf(name='a'), self.nk.nf(name='b')
+        plinks = [self.nk.lf(
+                             source = source,
+                             destination = target,
+                             name = 'l' + str(i)
+                             ) for i in range(5)]
+        costs = [3, 1, 5, 2, 4]
+        for shift in range(len(costs)):
+            rotation = costs[shift:] + costs[:shift]
+            for plink, cost in zip(plinks, rotation):
+                plink.costSD = plink.costDS = cost
+            _, path = self.nk.bellman_ford(
+                                           source,
+                                           target,
+                                           allowed_nodes = [source, target]
+                                           )
+            _, dijkstra_path, _ = self.nk.dijkstra(source, target)
+            self.assertEqual(path, [plinks[rotation.index(1)]])
+            self.assertEqual(path, dijkstra_path)
+
+    def test_negative_cycle(self):
+        self.assertFalse(self.nk.has_negative_cycle())
+        plink = self.nk.lf(source=self.route9[0], destination=self.route9[1])
+        plink.costSD, plink.costDS = -5, 1
+        self.assertTrue(self.nk.has_negative_cycle())
         
     def test_floyd_warshall(self):
         cost_plink = lambda plink: plink.costSD
-        all_length = self.nk.floyd_warshall()
+        all_length, node_to_idx = self.nk.floyd_warshall()
         for i, r in enumerate((self.route9, self.route10, self.route11)):
-            path_length = all_length[r[0]][r[1]]
+            path_length = all_length[node_to_idx[r[0]]][node_to_idx[r[1]]]
             _, path = self.nk.A_star(r[0], r[1])
             self.assertEqual(sum(map(cost_plink, path)), path_length)
             
+    def test_all_pairs(self):
+        for algorithm in (self.nk.all_pairs_dijkstra, self.nk.all_pairs_bellman_ford):
+            all_length, node_to_idx = algorithm()
+            for r in (self.route9, self.route10, self.route11):
+                path_length = all_length[node_to_idx[r[0]]][node_to_idx[r[1]]]
+                dist, _, _ = self.nk.dijkstra(r[0], r[1])
+                self.assertEqual(dist[r[1]], path_length)
+                
+    def test_all_pairs_without_numpy(self):
+        # without numpy (and therefore scipy), the matrices are lists of lists
+        # and must contain the same lengths
+        algorithms = (
+                      self.nk.floyd_warshall, 
+                      self.nk.all_pairs_dijkstra, 
+                      self.nk.all_pairs_bellman_ford
+                      )
+        lengths = [algorithm() for algorithm in algorithms]
+        flags = network.numpy_available, network.scipy_available
+        network.numpy_available = network.scipy_available = False
+        try:
+            for algorithm, (matrix, node_to_idx) in zip(algorithms, lengths):
+                all_length, _ = algorithm()
+                self.assertIsInstance(all_length, list)
+                self.assertEqual(all_length, [list(row) for row in matrix])
+        finally:
+            network.numpy_available, network.scipy_available = flags
+            
     def test_LP(self):
         for i, r in enumerate((self.route9, self.route10, self.route11)):
             path = self.nk.LP_SP_formulation(r[0], r[1])
             self.assertEqual(list(map(str, path)), self.results[i])
             
+class TestNegativeCycle(unittest.TestCase):
+
+    @start_pyNMS
+    def setUp(self):
+        source, target = self.nk.nf(name='a'), self.nk.nf(name='b')
+        self.plinks = [self.nk.lf(
+                                  source = source,
+                                  destination = target,
+                                  name = 'l' + str(i),
+                                  costDS = 10
+                                  ) for i in range(4)]
+
+    def test_parallel_negative_plinks(self):
+        # a node lowered once per parallel physical link is not in a 
+        # negative cycle: all cost orders are tried, so that one of them is
+        # decreasing in the scan order of the parallel physical links
+        for costs in permutations((-1, -2, -3, -4)):
+            for plink, cost in zip(self.plinks, costs):
+                plink.costSD = cost
+            self.assertFalse(self.nk.has_negative_cycle())
+        self.plinks[0].costDS = 3
+        self.assertTrue(self.nk.has_negative_cycle())
+
 class TestMCF(unittest.TestCase):
     
     results = (
@@ -207,13 +388,10 @@ class TestMCF(unittest.TestCase):
     
     @start_pyNMS_and_import_project('test_mcf.xls')
     def setUp(self):
-        source = self.nk.pn['node'][self.nk.name_to_id['node1']]
-        target = self.nk.pn['node'][self.nk.name_to_id['node4']]
+        source = self.nk.node_by_name('node1')
+        target = self.nk.node_by_name('node4')
         self.nk.LP_MCF_formulation(source, target, 12)
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_MCF(self):
         for plink_name, flow in self.results:
             plink = self.nk.pn['plink'][self.nk.name_to_id[plink_name]]
@@ -248,14 +426,11 @@ class TestISIS(unittest.TestCase):
     'router6'
     }))
  
-    @start_pyNMS_and_import_project('test_ISIS.xls')
+    @start_pyNMS_and_import_project('test_isis.xls')
     def setUp(self):
         self.ct.routing_panel.checkboxes[2].setChecked(False)
         self.pj.refresh()
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_ISIS(self):
         self.assertEqual(len(self.nk.pn['traffic']), 2)
         for traffic, path in self.results:
@@ -307,9 +482,6 @@ class TestOSPF(unittest.TestCase):
         self.ct.routing_panel.checkboxes[2].setChecked(False)
         self.pj.refresh()
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_OSPF(self):
         self.assertEqual(len(self.nk.pn['traffic']), 2)
         for traffic_link, path in self.results:
@@ -336,9 +508,6 @@ class TestCSPF(unittest.TestCase):
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
- 
     def test_CSPF(self):
         node1 = self.nk.nf(name='node1')
         node2 = self.nk.nf(name='node2')
@@ -368,19 +537,54 @@ class TestCSPF(unittest.TestCase):
         _, path = self.nk.A_star(node6, node7, 
                             excluded_plinks={plink15}, excluded_nodes={node4})
         self.assertEqual(list(map(str, path)), self.results[5])
-        
+
+class TestDisjointPaths(unittest.TestCase):
+
+    # trap topology: the shortest path s-a-b-t leaves no link-disjoint
+    # path back to the source, but the pair s-a-d-t / s-c-b-t exists
+    links = (
+    ('s', 'a', 1), ('a', 'b', 1), ('b', 't', 1), ('a', 'd', 2),
+    ('d', 't', 2), ('s', 'c', 2), ('c', 'b', 2)
+    )
+
+    results = ['sa', 'ad', 'dt', 'bt', 'cb', 'sc']
+
+    @start_pyNMS
+    def setUp(self):
+        nodes = {name: self.nk.nf(name=name) for name in 'sabtdc'}
+        for source, destination, cost in self.links:
+            self.nk.lf(
+                       source = nodes[source],
+                       destination = nodes[destination],
+                       name = source + destination,
+                       costSD = cost,
+                       costDS = cost
+                       )
+        self.source, self.target = nodes['s'], nodes['t']
+
+    def test_A_star_shortest_pair(self):
+        _, path = self.nk.A_star_shortest_pair(self.source, self.target)
+        self.assertEqual(list(map(str, path)), self.results)
+
+    def test_bhandari_suurbale(self):
+        for algorithm in (self.nk.bhandari, self.nk.suurbale):
+            pair = algorithm(self.source, self.target)
+            self.assertEqual(set(map(str, pair)), set(self.results))
+
 class TestRWA(unittest.TestCase):
      
     @start_pyNMS_and_import_project('test_RWA.xls')
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
         
     def test_RWA(self):
         project_new_graph = self.nk.RWA_graph_transformation()
         self.assertEqual(project_new_graph.network.LP_RWA_formulation(), 3)
+        
+    def test_largest_degree_first(self):
+        project_new_graph = self.nk.RWA_graph_transformation()
+        self.assertEqual(project_new_graph.network.largest_degree_first(), 3)
 
 ## Graph generation and IGP simulation
 
@@ -390,14 +594,12 @@ class TestHypercubeOSPF(unittest.TestCase):
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
         
     def test_HypercubeOSPF(self):
         dimension_window = GraphDimensionWindow('hypercube', self.ct)
         dimension_window.nodes_edit.setText(str(4))
         dimension_window.node_subtype_list.setText('Router')
-        dimension_window.confirm(_)
+        dimension_window.confirm(None)
         
         # we created a 4-dimensional hypercube: the network shoud have 16 nodes
         self.assertEqual(len(self.nk.pn['node']), 16)
@@ -430,21 +632,125 @@ class TestHypercubeOSPF(unittest.TestCase):
         
         # generate the ping and troubleshooting tab
         # troubleshooting = Troubleshooting(router, self.ct)
-        
+
+class TestPlinkDimensioning(unittest.TestCase):
+
+    @start_pyNMS
+    def setUp(self):
+        # 3-dimensional hypercube with OSPF
+        dimension_window = GraphDimensionWindow('hypercube', self.ct)
+        dimension_window.nodes_edit.setText(str(3))
+        dimension_window.node_subtype_list.setText('Router')
+        dimension_window.confirm(None)
+        self.vw.select(*self.vw.all_gnodes())
+        as_creation = ASCreation(set(self.vw.selected_nodes()), set(), self.ct)
+        as_creation.AS_type_list.text = 'OSPF'
+        as_creation.create_AS()
+        ospf_as ,= self.nk.pnAS.values()
+        ospf_as.management.find_links()
+        self.pj.refresh()
+
+    # routed traffics between the end routers of the physical links 
+    # (index, True if the traffic goes from source to destination), and a
+    # routed traffic between two routers at a distance of 2, load-balanced 
+    # over two ECMP paths.
+    # The destination IP is the IP of an interface of the destination, on a
+    # physical link whose other end is neither the source nor one of its
+    # neighbors (the first or last one, depending on 'select'): otherwise, 
+    # a router whose only route to the destination subnet is the connected
+    # route of a failed physical link cannot forward the traffic
+    def add_traffics(self, plinks, select):
+        all_plinks = list(self.nk.plinks.values())
+        pairs = []
+        for index, SD in plinks:
+            plink = all_plinks[index]
+            if SD:
+                pairs.append((plink.source, plink.destination))
+            else:
+                pairs.append((plink.destination, plink.source))
+        source = max(self.nk.ftr('node', 'router'), key=str)
+        neighbors = {node for node, _ in self.nk.graph[source.id]['plink']}
+        distance_2 = {
+                      node 
+                      for neighbor in neighbors 
+                      for node, _ in self.nk.graph[neighbor.id]['plink']
+                      } - neighbors - {source}
+        pairs.append((source, min(distance_2, key=str)))
+        for idx, (source, destination) in enumerate(pairs, 1):
+            traffic = self.nk.lf(
+                                 subtype = 'routed traffic',
+                                 source = source,
+                                 destination = destination,
+                                 throughput = 10*idx
+                                 )
+            _, source_plink = next(iter(self.nk.graph[source.id]['plink']))
+            close = {node for node, _ in self.nk.graph[source.id]['plink']}
+            destination_plink = select(
+                                       (
+                                       plink for node, plink 
+                                       in self.nk.graph[destination.id]['plink']
+                                       if node != source and node not in close
+                                       ), 
+                                       key = str
+                                       )
+            traffic.source_IP = source_plink('ip_address', source)
+            traffic.destination_IP = destination_plink('ip_address', destination)
+        self.nk.path_finder()
+
+    def worst_case(self, dimensioning):
+        for plink in self.nk.plinks.values():
+            plink.wctrafficSD = plink.wctrafficDS = 0.
+            plink.wcfailure = None
+        dimensioning()
+        return {
+                plink: (plink.wctrafficSD, plink.wctrafficDS, plink.wcfailure)
+                for plink in self.nk.plinks.values()
+                }
+
+    def compare_dimensioning(self):
+        for traffic in self.nk.traffics.values():
+            self.assertTrue(traffic.path)
+        nominal = {
+                   plink: (plink.trafficSD, plink.trafficDS)
+                   for plink in self.nk.plinks.values()
+                   }
+        # the failure of a physical link without traffic reroutes nothing
+        self.assertIn((0., 0.), nominal.values())
+        worst_case = self.worst_case(self.nk.plink_dimensioning)
+        worst_case_fast = self.worst_case(self.nk.plink_dimensioning_fast)
+        for plink, (wcSD, wcDS, wcfailure) in worst_case.items():
+            fast_wcSD, fast_wcDS, fast_wcfailure = worst_case_fast[plink]
+            self.assertAlmostEqual(wcSD, fast_wcSD)
+            self.assertAlmostEqual(wcDS, fast_wcDS)
+            self.assertEqual(wcfailure, fast_wcfailure)
+            # the nominal traffic is restored at the end
+            self.assertEqual((plink.trafficSD, plink.trafficDS), nominal[plink])
+
+    # the traffics below were chosen so that the worst case of some physical
+    # links depends on each part of plink_dimensioning_fast: the bandwidth 
+    # of the traffics that are not rerouted, in both directions, and the 
+    # shortcut for failures that do not reroute any traffic
+    def test_plink_dimensioning_fast(self):
+        self.add_traffics(((0, False), (8, False), (9, True)), max)
+        self.compare_dimensioning()
+
+    # a traffic is also rerouted when the subnet of its destination IP fails
+    def test_plink_dimensioning_fast_failed_subnet(self):
+        self.add_traffics(((2, False), (7, True), (11, False)), min)
+        self.compare_dimensioning()
+
 class TestSquareTilingISIS(unittest.TestCase):
      
     @start_pyNMS
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
         
     def test_SquareTilingISIS(self):
         dimension_window = GraphDimensionWindow('square-tiling', self.ct)
         dimension_window.nodes_edit.setText(str(10))
         dimension_window.node_subtype_list.setText('Router')
-        dimension_window.confirm(_)
+        dimension_window.confirm(None)
         
         # we created a square-tiling
         self.assertEqual(len(self.nk.pn['node']), 81)
@@ -484,14 +790,12 @@ class TestFullMeshRIP(unittest.TestCase):
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
         
     def test_FullMeshRIP(self):
         dimension_window = GraphDimensionWindow('full-mesh', self.ct)
         dimension_window.nodes_edit.setText(str(6))
         dimension_window.node_subtype_list.setText('Router')
-        dimension_window.confirm(_)
+        dimension_window.confirm(None)
         
         # we created a full-mesh
         self.assertEqual(len(self.nk.pn['node']), 5)
@@ -531,15 +835,13 @@ class TestMultipleObjectGeneration(unittest.TestCase):
     def setUp(self):
         pass
  
-    def tearDown(self):
-        self.app.quit()
         
     def test_ObjectGeneration(self):
         # we created 10 nodes with the multiple nodes window
         multiple_nodes = MultipleNodes(0, 0, self.ct)
         multiple_nodes.nb_nodes_edit.setText(str(10))
         multiple_nodes.node_subtype_list.setText('Switch')
-        multiple_nodes.create_nodes(_)
+        multiple_nodes.create_nodes(None)
         
         self.assertEqual(len(self.nk.pn['node']), 10)
         
@@ -6,11 +6,19 @@ from right_click_menus.main_network_selection_menu import MainNetworkSelectionMe
 
 class GraphicalLink(QGraphicsLineItem):
     
-    def __init__(self, view, link=None):
+    # right-click menu class, depending on the subtype of the view
+    menus = {
+            'network': MainNetworkSelectionMenu,
+            'insite': InternalSiteSelectionMenu,
+            }
+    
+    # when add_to_scene is False, the caller is responsible for adding the
+    # link to the scene: used to add links in bulk once they are all created
+    def __init__(self, view, link=None, add_to_scene=True):
         super().__init__()
         self.view = view
         self.controller = view.controller
-        self.setFlag(QGraphicsItem.ItemIsSelectable, self.view.selection['link'])
+        self.setFlag(QGraphicsItem.ItemIsSelectable, self.view.link_selectable)
         if link:
             self.link = link
             # source and destination graphic nodes
@@ -26,9 +34,13 @@ class GraphicalLink(QGraphicsLineItem):
                                         )
         self.object = self.link
         self.setZValue(2)
-        self.setPen(view.link_color[self.link.subtype])
+        # the unselected pen is retrieved once: it is restored every time the
+        # link is deselected
+        self.default_pen = view.link_color[self.link.subtype]
+        self.setPen(self.default_pen)
         self.update_position()
-        view.scene.addItem(self)
+        if add_to_scene:
+            view.scene.addItem(self)
         self.link.glink[view] = self.link.gobject[view] = self
         
     @property
@@ -36,7 +48,7 @@ class GraphicalLink(QGraphicsLineItem):
         # for a link to be selectable, the selection mode must be one, and the
         # link selection must be activated (display menu)
         selection_allowed = self.controller.mode == 'selection'
-        link_selection_allowed = self.view.selection['link']
+        link_selection_allowed = self.view.link_selectable
         return selection_allowed and link_selection_allowed
         
     def mousePressEvent(self, event):
@@ -51,10 +63,7 @@ class GraphicalLink(QGraphicsLineItem):
             # the selection mode
             self.setFlag(QGraphicsItem.ItemIsSelectable, True)
             self.setSelected(True)
-            menu = {
-                    'network': MainNetworkSelectionMenu,
-                    'internal': InternalSiteSelectionMenu,
-                    }[self.view.subtype](self.controller)
+            menu = self.menus[self.view.subtype](self.controller)
             menu.exec_(QCursor.pos())
             self.setFlag(QGraphicsItem.ItemIsSelectable, self.is_selectable)
             
@@ -63,13 +72,26 @@ class GraphicalLink(QGraphicsLineItem):
             if self.isSelected():
                 self.setPen(self.view.selection_pen)
             else:
-                self.setPen(self.view.link_color[self.link.subtype])
+                self.setPen(self.default_pen)
         return QGraphicsLineItem.itemChange(self, change, value)
         
     def update_position(self):
+        # setLine accepts the coordinates directly: no QLineF is needed
         start_position = self.source.pos()
         end_position = self.destination.pos()
-        self.setLine(QLineF(start_position, end_position))
+        self.setLine(
+                     start_position.x(), 
+                     start_position.y(), 
+                     end_position.x(), 
+                     end_position.y()
+                     )
+        
+    @staticmethod
+    def bulk_update_positions(glinks):
+        # when several nodes are moved at once, a link attached to two of them
+        # is updated once instead of once per moved end
+        for glink in set(glinks):
+            glink.update_position()
         
     def self_destruction(self):
         self.view.scene.removeItem(self)
\ No newline at end of file
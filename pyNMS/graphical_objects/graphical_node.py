@@ -73,8 +73,13 @@ class GraphicalNode(QGraphicsPixmapItem):
                 self.label.setZValue(15)
             self.label.setPos(self.pos() + QPoint(-20, 40))
         if change == self.ItemScenePositionHasChanged:
-            for glink in self.view.attached_glinks(self):
-                glink.update_position()
+            # during a bulk move, links are collected by the view and updated
+            # once the move is over
+            if self.view.moved_glinks is not None:
+                self.view.moved_glinks.update(self.view.attached_glinks(self))
+            else:
+                for glink in self.view.attached_glinks(self):
+                    glink.update_position()
         return QGraphicsPixmapItem.itemChange(self, change, value)
         
     def mousePressEvent(self, event):
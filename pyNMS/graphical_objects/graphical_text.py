@@ -8,6 +8,9 @@ class GraphicalText(QGraphicsTextItem, GraphicalShape):
     class_type = 'shape'
     subtype = 'text'
     
+    # the font is built once for the class: QFont is implicitly shared, which
+    # means that setFont does not copy the font data, all text items refer to
+    # this single font until one of them is modified
     default_font = QFont()
     default_font.setFamily('Courier New')
     default_font.setPointSize(24)
@@ -26,8 +26,10 @@ class RouterConfiguration(QWidget):
         
         config_edit = QConsoleEdit()
             
-        for conf in self.network.build_router_configuration(node):
-            config_edit.insertPlainText(conf + '\n')
+        # the configuration is inserted in a single call, instead of one
+        # call (and one update of the text edit) per line
+        config = self.network.build_router_configuration(node)
+        config_edit.insertPlainText(''.join(conf + '\n' for conf in config))
             
         layout = QGridLayout()
         layout.addWidget(config_edit, 0, 0, 1, 1)
@@ -43,8 +45,8 @@ class SwitchConfiguration(QWidget):
         
         config_edit = QConsoleEdit()
         
-        for conf in self.network.build_switch_configuration(node):
-            config_edit.insertPlainText(conf + '\n')
+        config = self.network.build_switch_configuration(node)
+        config_edit.insertPlainText(''.join(conf + '\n' for conf in config))
             
         layout = QGridLayout()
         layout.addWidget(config_edit, 0, 0, 1, 1)
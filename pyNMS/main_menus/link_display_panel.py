@@ -12,6 +12,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from functools import partial
 from miscellaneous.decorators import update_paths
 from objects.objects import *
 from os.path import join
@@ -34,6 +35,15 @@ from PyQt5.QtWidgets import (
                              QGroupBox,
                              )
 
+# link icons are shared by all panels: an icon file is only read once,
+# no matter how many times the panel is created
+icons = {}
+
+def get_icon(image_path):
+    if image_path not in icons:
+        icons[image_path] = QIcon(image_path)
+    return icons[image_path]
+
 class LinkDisplayPanel(QGroupBox):
     
     def __init__(self, controller):
@@ -48,12 +58,13 @@ class LinkDisplayPanel(QGroupBox):
                 continue
             button = QPushButton(self)
             button.setStyleSheet('QPushButton{ background-color: rgb(255, 255, 255);}')
-            button.clicked.connect(lambda _, s=subtype: self.change_display(s))
+            button.clicked.connect(partial(self.change_display, subtype))
             image_path = join(controller.path_icon, subtype + '.png')
-            button.setIcon(QIcon(image_path))
+            button.setIcon(get_icon(image_path))
             button.setIconSize(QtCore.QSize(120, 30))
             layout.addWidget(button, index // 2, index % 2, 1, 1)
             
+    # 'checked' is the boolean sent by the clicked signal
     @update_paths
-    def change_display(self, subtype):
+    def change_display(self, subtype, checked=False):
         self.view.per_subtype_display(subtype)   
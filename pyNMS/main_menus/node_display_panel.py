@@ -12,6 +12,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from functools import partial
 from miscellaneous.decorators import update_paths
 from objects.objects import *
 from os.path import join
@@ -76,14 +77,15 @@ class NodeDisplayPanel(QGroupBox):
         self.buttons = {}
         for index, subtype in enumerate(network_node_subtype + ('site',)):
             button = MenuPushButton(controller, subtype)
-            button.clicked.connect(lambda _, s=subtype: self.change_display(s))
+            button.clicked.connect(partial(self.change_display, subtype))
             image_path = join(controller.path_icon, 'default_{}.gif'.format(subtype))
             button.setIcon(QIcon(image_path))
             button.setIconSize(QtCore.QSize(50, 50))
             self.buttons[subtype] = button
             layout.addWidget(button, index // 4, index % 4, 1, 1)
             
+    # 'checked' is the boolean sent by the clicked signal
     @update_paths
-    def change_display(self, subtype):
+    def change_display(self, subtype, checked=False):
         self.view.per_subtype_display(subtype)        
             
\ No newline at end of file
@@ -46,5 +46,6 @@ class SelectionPanel(QGroupBox):
             item.setFlag(QGraphicsItem.ItemIsMovable, can_be_selected)
             item.setFlag(QGraphicsItem.ItemIsSelectable, can_be_selected)
         self.view.selection[mode] = can_be_selected
+        self.view.link_selectable = self.view.selection['link']
 
         
\ No newline at end of file
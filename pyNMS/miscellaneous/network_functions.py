@@ -14,6 +14,10 @@
 
 class DataFlow(object):
     
+    # a data flow is copied for each ECMP route at each router of its path:
+    # slots make both the objects and the copies lighter
+    __slots__ = ('src_ip', 'dst_ip', 'throughput', 'src_mac', 'dst_mac')
+    
     def __init__(self, src_ip, dst_ip):
         self.src_ip = src_ip
         self.dst_ip = dst_ip
@@ -21,6 +25,14 @@ class DataFlow(object):
         self.src_mac = None
         self.dst_mac = None
         
+    # shallow copy without the generic copy machinery (__reduce_ex__)
+    def clone(self):
+        dataflow = DataFlow.__new__(DataFlow)
+        dataflow.src_ip, dataflow.dst_ip = self.src_ip, self.dst_ip
+        dataflow.throughput = self.throughput
+        dataflow.src_mac, dataflow.dst_mac = self.src_mac, self.dst_mac
+        return dataflow
+        
     def __repr__(self):
         return '''Data flow:
         Source IP: {src_ip} Destination IP: {dst_ip}
@@ -35,6 +47,10 @@ class DataFlow(object):
                    )
         
 class IPAddress(object):
+    
+    # one IP address object is created per interface, and they are stored in
+    # routing tables, ARP tables and ip_to_oip: slots make them lighter
+    __slots__ = ('ip_addr', 'subnet', 'mask', 'network', 'interface')
 
     # an IP address object is defined as an IP and a subnet ('IP/subnet')
     def __init__(self, ip_addr, subnet, interface=None):
@@ -51,13 +67,14 @@ class IPAddress(object):
     def __lt__(self, other):
         return self.interface.name
 
-BYTE = range(32, 0, -8)
-
+# conversion between a dotted IP address and its integer value: the bytes are
+# unpacked and shifted directly, without looping over their offsets
 def toip(ip):
-    return sum(x << s - 8 for x, s in zip(map(int, ip.split('.')), BYTE))
+    a, b, c, d = map(int, ip.split('.'))
+    return a << 24 | b << 16 | c << 8 | d
     
 def tostring(ip):
-    return '.'.join(str((ip & (1 << i) - 1) >> (i - 8)) for i in BYTE)
+    return '{}.{}.{}.{}'.format(ip >> 24 & 255, ip >> 16 & 255, ip >> 8 & 255, ip & 255)
 
 def compute_network(ip, mask):
     return tostring(toip(ip) & toip(mask))
@@ -73,10 +90,22 @@ def wildcard(ip):
     #     towildcard('0.0.0.3') = '255.255.255.252'
     return '.'.join(map(lambda i: str(255 - int(i)), ip.split('.')))
 
+# the 33 subnet masks are computed once, and indexed by subnet
+subnet_masks = [
+                tostring(int('1'*subnet + '0'*(32 - subnet), 2)) 
+                for subnet in range(33)
+                ]
+
 def tomask(subnet):
     # convert a subnet to a subnet mask
     # ex: tomask(30) = '255.255.255.252'
-    return tostring(int('1'*subnet + '0'*(32 - subnet), 2))
+    return subnet_masks[subnet]
+    
+# zero-padded representation of all byte values, used to derive IS-IS 
+# system IDs from IP addresses
+# ex: '.'.join(padded_bytes[int(n)] for n in '10.0.0.1'.split('.')) 
+# = '010.000.000.001'
+padded_bytes = [format(byte, '03d') for byte in range(256)]
     
 def mac_incrementer(mac_address, nb):
     # increment a mac address by 'nb'
@@ -19,11 +19,14 @@ class UnionFind:
         self.rank = {node: 0 for node in nodes}
         
     def find(self, node):
-        if self.up[node] == node:
-            return node
-        else:
-            self.up[node] = self.find(self.up[node])
-            return self.up[node]
+        # iterative path compression (path halving): each visited node is made
+        # to point to its grandparent, which avoids python recursion limits 
+        # on long chains
+        up = self.up
+        while up[node] != node:
+            up[node] = up[up[node]]
+            node = up[node]
+        return node
             
     def union(self, nA, nB):
         repr_nA = self.find(nA)
@@ -35,5 +38,5 @@ class UnionFind:
             if self.rank[repr_nA] == self.rank[repr_nB]:
                 self.rank[repr_nA] += 1   
         else:
-            self.up[repr_nA] == repr_nB
+            self.up[repr_nA] = repr_nB
         return True
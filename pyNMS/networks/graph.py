@@ -12,9 +12,27 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from array import array
+from ast import literal_eval
 from objects.objects import *
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import chain
 from math import sqrt
+from sys import intern
+# scipy is optional: if it is missing, graph traversals (BFS, connected
+# components) fall back on a pure python implementation
+try:
+    import numpy as np
+    from scipy.sparse import csgraph, csr_matrix
+    scipy_available = True
+except ImportError:
+    scipy_available = False
+
+# names are interned when an object is created, so that the keys of 
+# name_to_id are shared with the objects themselves. Names imported from 
+# a spreadsheet may also be numbers, which cannot be interned.
+def intern_name(name):
+    return intern(name) if type(name) is str else name
 
 class Graph(object):
     
@@ -32,6 +50,20 @@ class Graph(object):
         # based on its name. The only object that needs changing when a object
         # is renamed by the user.
         self.name_to_id = {}
+        
+        # compressed sparse row (CSR) snapshot of the graph, per link type.
+        # it is built on demand by 'freeze' for read-only traversals, and 
+        # emptied whenever a node or a link is created or deleted
+        self.csr = {}
+        
+        # (source ID, destination ID, link type) -> links from the source
+        # to the destination: used to find the links between two nodes without 
+        # scanning the neighborhood of one of them. Both directions are stored.
+        self.adjacency = defaultdict(list)
+        
+        # type -> subtype -> {ID: object}: used by 'ftr' to retrieve all 
+        # objects of some subtypes without scanning all objects of that type
+        self.subtype_index = defaultdict(lambda: defaultdict(dict))
 
         # set of all objects in failure: this parameter is used for
         # link dimensioning and failure simulation
@@ -39,41 +71,60 @@ class Graph(object):
 
     # function filtering pn to retrieve all objects of given subtypes
     def ftr(self, type, *sts):
-        keep = lambda r: r.subtype in sts
         if type == 'interface':
-            return filter(keep, self.pn[type])
-        else:
-            return filter(keep, self.pn[type].values())
+            if len(sts) > 3:
+                sts = frozenset(sts)
+            return (obj for obj in self.pn[type] if obj.subtype in sts)
+        index = self.subtype_index[type]
+        # a subtype given twice must not yield its objects twice
+        sts = dict.fromkeys(sts)
+        return chain.from_iterable(index[st].values() for st in sts)
         
     # function filtering graph to retrieve all links of given subtypes
     # attached to the source node. 
     # if ud (undirected) is set to True, we retrieve all links of the 
     # corresponding subtypes, else we check that 'src' is the source
     def gftr(self, src, type, *sts, ud=True):
-        keep = lambda r: r[1].subtype in sts and (ud or r[1].source == src)
-        return filter(keep, self.graph[src.id][type])
+        # a membership test in a short tuple is as fast as in a set, which 
+        # is only worth building for more than a few subtypes
+        if len(sts) > 3:
+            sts = frozenset(sts)
+        return (
+                (neighbor, link) 
+                for neighbor, link in self.graph[src.id][type] 
+                if link.subtype in sts and (ud or link.source == src)
+                )
           
     # 'lf' is the link factory. Creates or retrieves any type of link
     def lf(self, subtype='ethernet link', id=None, name=None, **kwargs):
         link_type = subtype_to_type[subtype]
         # creation link in the s-d direction if no link at all yet
         if not id:
-            if name in self.name_to_id:
-                link = self.pn[link_type][self.name_to_id[name]]
+            # a single lookup in name_to_id to find an existing link
+            existing_id = self.name_to_id.get(name)
+            if existing_id is not None:
+                link = self.pn[link_type][existing_id]
                 link.update_properties(kwargs)
                 return link
             s, d = kwargs['source'], kwargs['destination']
             id = self.cpt_link
             if not name:
                 name = subtype + str(self.cpt_link)
+            name = intern_name(name)
             kwargs.update({'id': id, 'name': name})
             new_link = link_class_with_vc[subtype](**kwargs)
             self.name_to_id[name] = id
+            self.csr.clear()
             self.pn[link_type][id] = new_link
-            self.graph[s.id][link_type].add((d, new_link))
-            self.graph[d.id][link_type].add((s, new_link))
+            self.subtype_index[link_type][new_link.subtype][id] = new_link
+            graph, adjacency = self.graph, self.adjacency
+            graph[s.id][link_type].add((d, new_link))
+            graph[d.id][link_type].add((s, new_link))
+            adjacency[(s.id, d.id, link_type)].append(new_link)
+            adjacency[(d.id, s.id, link_type)].append(new_link)
             if subtype in ('ethernet link', 'optical link'):
-                self.interfaces |= {new_link.interfaceS, new_link.interfaceD}
+                self.interfaces.add(new_link.interfaceS)
+                self.interfaces.add(new_link.interfaceD)
             self.cpt_link += 1
         return self.pn[link_type][id]
         
@@ -83,17 +134,25 @@ class Graph(object):
             name = subtype + str(self.cpt_node)
             kwargs['name'] = name
         else:
-            if kwargs['name'] in self.name_to_id:
-                node = self.nodes[self.name_to_id[kwargs['name']]]
+            existing_id = self.name_to_id.get(kwargs['name'])
+            if existing_id is not None:
+                node = self.nodes[existing_id]
                 node.update_properties(kwargs)
                 return node
+            kwargs['name'] = intern_name(kwargs['name'])
         id = self.cpt_node
         kwargs['id'] = id
-        self.nodes[id] = node_class[subtype](**kwargs)
+        node = self.nodes[id] = node_class[subtype](**kwargs)
+        self.subtype_index['node'][node.subtype][id] = node
         self.name_to_id[kwargs['name']] = id
+        self.csr.clear()
         self.cpt_node += 1
         return self.nodes[id]
         
+    # retrieves an existing node from its name, without creating it
+    def node_by_name(self, name):
+        return self.nodes[self.name_to_id[name]]
+        
     # 'of' is the object factory: returns a link or a node from its name
     def of(self, name, _type):
         if _type == 'node':
@@ -123,12 +182,19 @@ class Graph(object):
     
     # methods used to convert a string to an object 
     
-    # convert a node name to a node
+    # convert a node name to a node: existing nodes are retrieved directly, 
+    # the node factory is only called to create a missing node
     def convert_node(self, node_name):
+        id = self.name_to_id.get(node_name)
+        if id is not None:
+            return self.nodes[id]
         return self.nf(name=node_name)
     
     # convert a link name to a node
     def convert_link(self, link_name, subtype='ethernet link'):
+        id = self.name_to_id.get(link_name)
+        if id is not None:
+            return self.pn[subtype_to_type[subtype]][id]
         return self.lf(name=link_name, subtype=subtype)
         
     # convert an iterable of strings representing nodes, to a generator of nodes
@@ -137,11 +203,11 @@ class Graph(object):
     
     # convert a string representing a set of nodes, to an actual set of nodes
     def convert_node_set(self, node_set):
-        return set(map(self.convert_node, eval(node_set)))
+        return set(map(self.convert_node, literal_eval(node_set)))
     
     # convert a string representing a list of nodes, to an actual list of nodes
     def convert_node_list(self, node_list):
-        return list(map(self.convert_node, eval(node_list)))
+        return list(map(self.convert_node, literal_eval(node_list)))
         
     # convert an iterable of strings representing links, to a generator of links
     def convert_links(self, links):
@@ -150,102 +216,218 @@ class Graph(object):
     # convert a string representing a set of links, to an actual set of links
     def convert_link_set(self, link_set, subtype='ethernet link'):
         convert = lambda link: self.convert_link(link, subtype)
-        return set(map(convert, eval(link_set)))
+        return set(map(convert, literal_eval(link_set)))
     
     # convert a string representing a list of links, to an actual list of links
     def convert_link_list(self, link_list, subtype='ethernet link'):
         convert = lambda link: self.convert_link(link, subtype)
-        return list(map(convert, eval(link_list)))
+        return list(map(convert, literal_eval(link_list)))
             
     def erase_network(self):
         self.graph.clear()
+        self.csr.clear()
+        self.adjacency.clear()
         for dict_of_objects in self.pn.values():
             dict_of_objects.clear()
+        self.subtype_index.clear()
             
+    # removes the node from the model, and returns the list of attached links:
+    # they are detached from the neighbors in the same pass, but they must
+    # still be deleted with remove_link. Removing a node twice has no effect.
     def remove_node(self, node):
-        self.nodes.pop(self.name_to_id.pop(node.name))
-        # retrieve adj links to delete them 
+        self.nodes.pop(self.name_to_id.pop(node.name, None), None)
+        self.subtype_index['node'][node.subtype].pop(node.id, None)
+        self.csr.clear()
+        adjacent_links = []
         dict_of_adj_links = self.graph.pop(node.id, {})
         for type_link, adj_obj in dict_of_adj_links.items():
             for neighbor, adj_link in adj_obj:
-                yield adj_link
+                # 'get' (and not []) does not recreate the adjacency of the
+                # node itself in case of a self-loop
+                neighbor_adjacency = self.graph.get(neighbor.id)
+                if neighbor_adjacency is not None:
+                    neighbor_adjacency[type_link].discard((node, adj_link))
+                adjacent_links.append(adj_link)
+        return adjacent_links
 
     def remove_link(self, link):
         # if it is a physical link, remove the link's interfaces from the model
         if link.type == 'plink':
-            self.interfaces -= {link.interfaceS, link.interfaceD}
-        # remove the link itself from the model
-        self.graph[link.source.id][link.type].discard((link.destination, link))
-        self.graph[link.destination.id][link.type].discard((link.source, link))
+            self.interfaces.discard(link.interfaceS)
+            self.interfaces.discard(link.interfaceD)
+        # remove the link itself from the model. The adjacency of a node that
+        # was already removed must not be recreated.
+        for node, neighbor in (
+                               (link.source, link.destination), 
+                               (link.destination, link.source)
+                               ):
+            if node.id in self.graph:
+                self.graph[node.id][link.type].discard((neighbor, link))
         self.pn[link.type].pop(self.name_to_id.pop(link.name, None), None)
+        self.subtype_index[link.type][link.subtype].pop(link.id, None)
+        self.csr.clear()
+        s, d = link.source.id, link.destination.id
+        for key in ((s, d, link.type), (d, s, link.type)):
+            links = self.adjacency.get(key, [])
+            if link in links:
+                links.remove(link)
+            # empty entries are removed, so that is_connected can check
+            # whether a key exists
+            if not links:
+                self.adjacency.pop(key, None)
             
     def is_connected(self, nodeA, nodeB, link_type, subtype=None):
+        key = (nodeB.id, nodeA.id, link_type)
         if not subtype:
-            return any(n == nodeA for n, _ in self.graph[nodeB.id][link_type])
+            return key in self.adjacency
         else:
-            return any(n == nodeA for n, _ in self.gftr(nodeB, link_type, subtype))
+            links = self.adjacency.get(key, [])
+            return any(link.subtype == subtype for link in links)
         
     # given a node, retrieves nodes attached with a link which subtype 
     # is in sts
     def neighbors(self, node, *subtypes):
+        self.freeze()
+        index = self.csr_index[node.id]
         for subtype in subtypes:
-            for neighbor, _ in self.graph[node.id][subtype]:
-                yield neighbor
+            indptr, indices, _ = self.csr[subtype]
+            for neighbor in indices[indptr[index]:indptr[index+1]]:
+                yield self.csr_nodes[neighbor]
                 
     def all_nodes(self):
         yield from self.nodes.values()
                 
     def all_links(self):
-        for type in link_type:
-            yield from self.pn[type].values()
+        return chain.from_iterable(self.pn[type].values() for type in link_type)
+            
+    # number of links of all types: the size of each link dictionary is
+    # already maintained by the link factory and removal functions
+    @property
+    def link_count(self):
+        return sum(len(self.pn[type]) for type in link_type)
                 
     # given a node, retrieves all attached links    
     def attached_links(self, node):
+        # the node adjacency is retrieved once, not once per link type
+        adjacency = self.graph[node.id]
         for type in link_type:
-            # we make it a set as this function is used, among other things,
-            # for the deletion of links and a set cannot change size during
-            # iteration
-            for _, link in set(self.graph[node.id][type]):
+            # we iterate over a copy as this function is used, among other 
+            # things, for the deletion of links and a set cannot change size 
+            # during iteration: a tuple is copied without hashing its items
+            for _, link in tuple(adjacency[type]):
                 yield link
         
     def number_of_links_between(self, nodeA, nodeB):
         return sum(
-                   n == nodeB 
-                   for _type in self.link_type 
-                   for n, _ in self.graph[nodeA.id][_type]
+                   len(self.adjacency.get((nodeA.id, nodeB.id, _type), []))
+                   for _type in link_type
                    )
         
     def links_between(self, nodeA, nodeB, _type='all'):
-        if _type == 'all':
-            for type in link_type:
-                for neighbor, link in self.graph[nodeA.id][type]:
-                    if neighbor == nodeB:
-                        yield link
-        else:
-            for neighbor, link in self.graph[nodeA.id][_type]:
-                if neighbor == nodeB:
-                    yield link
+        types = link_type if _type == 'all' else (_type,)
+        for type in types:
+            # the list is copied, as the caller may delete the links
+            yield from list(self.adjacency.get((nodeA.id, nodeB.id, type), []))
+                                                
+    ## CSR representation
+    
+    # for each link type, self.csr contains a tuple (indptr, indices, links):
+    # the neighbors of the node at index i are the nodes at the indices
+    # indices[indptr[i]:indptr[i+1]], and links[k] is the link toward the 
+    # neighbor indices[k]. csr_nodes maps an index to its node, and csr_index
+    # maps a node ID to its index.
+    # csr_source[type][k] is 1 if the node at index i is the source of
+    # links[k]: directional properties (e.g 'cost' with costSD / costDS) can 
+    # be read directly, without calling the link.
+    # functions that alternate between reading and modifying the graph (e.g
+    # is_connected, attached_links) do not use it, as the snapshot would 
+    # have to be rebuilt after each modification.
+    def freeze(self):
+        if self.csr:
+            return
+        self.csr_nodes = list(self.nodes.values())
+        self.csr_index = {node.id: i for i, node in enumerate(self.csr_nodes)}
+        self.csr_source = {}
+        for type in link_type:
+            indptr, indices, links = array('i', [0]), array('i'), []
+            source = bytearray()
+            for node in self.csr_nodes:
+                for neighbor, link in self.graph[node.id][type]:
+                    indices.append(self.csr_index[neighbor.id])
+                    links.append(link)
+                    source.append(link.source == node)
+                indptr.append(len(indices))
+            self.csr[type] = (indptr, indices, links)
+            self.csr_source[type] = source
+            
+    # scipy sparse matrix built from the CSR snapshot of a link type
+    def sparse_matrix(self, type='plink'):
+        self.freeze()
+        indptr, indices, _ = self.csr[type]
+        n = len(self.csr_nodes)
+        return csr_matrix((
+                           np.ones(len(indices)), 
+                           np.frombuffer(indices, dtype=np.intc), 
+                           np.frombuffer(indptr, dtype=np.intc)
+                           ), 
+                           shape = (n, n)
+                           )
                                                 
     ## Graph functions
     
+    # pure python BFS on the CSR snapshot: yields the indices of all nodes
+    # that can be reached from the node at index 'start'.
+    # 'visited' is a bitmap indexed by CSR index, that can be shared between 
+    # several calls so that already visited nodes are skipped
+    def csr_bfs(self, start, visited=None):
+        indptr, indices, _ = self.csr['plink']
+        if visited is None:
+            visited = bytearray(len(self.csr_nodes))
+        visited[start], queue = 1, deque([start])
+        while queue:
+            node = queue.popleft()
+            for neighbor in indices[indptr[node]:indptr[node+1]]:
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    queue.append(neighbor)
+                    yield neighbor
+    
+    # yields all nodes that can be reached from the source with physical 
+    # links, except the source itself, layer by layer
     def bfs(self, source):
-        visited = set()
-        layer = {source}
-        while layer:
-            temp = layer
-            layer = set()
-            for node in temp:
-                if node not in visited:
-                    visited.add(node)
-                    for neighbor, _ in self.graph[node.id]['plink']:
-                        layer.add(neighbor)
-                        yield neighbor
+        self.freeze()
+        start = self.csr_index[source.id]
+        if scipy_available:
+            order = csgraph.breadth_first_order(
+                                                self.sparse_matrix('plink'), 
+                                                start, 
+                                                directed = False, 
+                                                return_predecessors = False
+                                                )
+            # the first node of the BFS order is the source itself
+            for index in order[1:]:
+                yield self.csr_nodes[index]
+            return
+        for index in self.csr_bfs(start):
+            yield self.csr_nodes[index]
     
     def connected_components(self):
-        visited = set()
-        for node in self.nodes.values():
-            if node not in visited:
-                new_comp = set(self.bfs(node))
-                visited.update(new_comp)
+        self.freeze()
+        if scipy_available:
+            nb_components, labels = csgraph.connected_components(
+                                                self.sparse_matrix('plink'), 
+                                                directed = False
+                                                )
+            components = [set() for _ in range(nb_components)]
+            for node, label in zip(self.csr_nodes, labels):
+                components[label].add(node)
+            yield from components
+            return
+        visited = bytearray(len(self.csr_nodes))
+        for index, node in enumerate(self.csr_nodes):
+            if not visited[index]:
+                new_comp = {node}
+                for neighbor in self.csr_bfs(index, visited):
+                    new_comp.add(self.csr_nodes[neighbor])
                 yield new_comp
         
\ No newline at end of file
@@ -13,26 +13,37 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .graph import Graph
+from array import array
 from autonomous_system.AS import AS_class
 from objects import objects
 import random
 import re
 import warnings
-from copy import copy
 from ip_networks.configuration import RouterConfiguration
 from objects.objects import *
 from miscellaneous.network_functions import *
 from math import cos, sin, asin, radians, sqrt, ceil, log
 from collections import defaultdict, deque, OrderedDict
-from heapq import heappop, heappush, nsmallest
+from heapq import heapify, heappop, heappush, nsmallest
 from operator import getitem, itemgetter
-from itertools import combinations
+from itertools import combinations, count
 from miscellaneous.union_find import UnionFind
 try:
     import numpy as np
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+try:
     from cvxopt import matrix, glpk, solvers
 except ImportError:
     warnings.warn('Package missing: linear programming functions will fail')
+# floyd-warshall and the all-pairs shortest path functions use the compiled 
+# scipy implementations when they are available
+try:
+    from scipy.sparse import csgraph
+    scipy_available = True
+except ImportError:
+    scipy_available = False
 
 class Network(Graph):
     
@@ -66,6 +77,9 @@ class Network(Graph):
         self.ma_segments = defaultdict(set)
         # string IP <-> IP mapping for I/E + parameters saving
         self.ip_to_oip = {}
+        # IP addresses created since the last subnetwork update: the 
+        # subnetwork of their physical link has not been set yet
+        self.pending_ips = set()
         
         # osi layer to devices
         self.osi_layers = {
@@ -74,6 +88,17 @@ class Network(Graph):
         1: ('regenerator', 'splitter', 'antenna')
         }
         
+        # layer to the subtypes of all lower layers: these devices are 
+        # transparent when looking for the segments of that layer
+        self.transparent_subtypes = {
+        layer: frozenset(
+                         subtype
+                         for l in range(1, layer)
+                         for subtype in self.osi_layers[l]
+                         )
+        for layer in self.osi_layers
+        }
+        
     # function filtering AS either per layer or per subtype
     def ASftr(self, filtering_mode, *sts):
         if filtering_mode == 'layer':
@@ -108,6 +133,8 @@ class Network(Graph):
             except ValueError:
                 # wrong IP address format
                 OIP = None
+            else:
+                self.pending_ips.add(OIP)
             self.ip_to_oip[str_ip] = OIP
             return OIP
         
@@ -188,42 +215,33 @@ class Network(Graph):
         # at this point, there isn't any IP allocated yet: we cannot assign
         # IP addresses until we know the network layer-n segment topology.
         # we use that topology to create layer-n virtual connection
-        # we keep the set of all physical links we've already visited 
-        visited_plinks = set()
-        # we loop through all the layer-n-networks boundaries
-        for router in self.ftr('node', *self.osi_layers[layer]):
-            # we start by looking at all attached physical links, and when we find one
-            # that hasn't been visited yet, we don't stop until we've discovered
-            # all network's physical links (i.e until we've reached all boundaries 
-            # of that networks: routers or host).
-            for neighbor, plink in self.graph[router.id]['plink']:
-                if plink in visited_plinks:
-                    continue
-                visited_plinks.add(plink)
-                # we update the set of physical linkss of the network 
-                # as we discover them
-                current_network = {(plink, router)}
-                if any(neighbor.subtype in self.osi_layers[l] for l in range(1, layer)):
-                    # we add the neighbor of the router in the stack: we'll fill 
-                    # the stack with nodes as we discover them, provided that 
-                    # these nodes are not boundaries, i.e not router or host
-                    stack_network = [neighbor]
-                    visited_nodes = {router}
-                    while stack_network:
-                        curr_node = stack_network.pop()
-                        for node, adj_plink in self.graph[curr_node.id]['plink']:
-                            if node in visited_nodes:
-                                continue
-                            visited_plinks.add(adj_plink)
-                            visited_nodes.add(node)
-                            if any(node.subtype in self.osi_layers[l] 
-                                                    for l in range(1, layer)):
-                                stack_network.append(node)
-                            else:
-                                current_network.add((adj_plink, node))
-                else:
-                    current_network.add((plink, neighbor))
-                self.ma_segments[layer].add(frozenset(current_network))
+        # nodes of a lower layer are transparent: a layer-n segment is made of
+        # all physical links connected to each other through transparent nodes
+        transparent = self.transparent_subtypes[layer]
+        # we merge the physical links attached to each transparent node in a
+        # single pass, instead of a flood-fill search from each boundary
+        segment_of = UnionFind(self.plinks.values())
+        for node in self.nodes.values():
+            if node.subtype not in transparent:
+                continue
+            plinks = [plink for _, plink in self.graph[node.id]['plink']]
+            for plink in plinks[1:]:
+                segment_of.union(plinks[0], plink)
+        # the boundaries of a segment are the nodes that are not transparent:
+        # we keep one physical link per boundary, used as the exit interface
+        # of the virtual connections
+        segments = defaultdict(dict)
+        for plink in self.plinks.values():
+            boundaries = segments[segment_of.find(plink)]
+            for node in (plink.source, plink.destination):
+                if node.subtype not in transparent:
+                    boundaries.setdefault(node, plink)
+        # only the segments with at least one layer-n boundary are kept
+        for boundaries in segments.values():
+            if any(n.subtype in self.osi_layers[layer] for n in boundaries):
+                self.ma_segments[layer].add(frozenset(
+                            (plink, node) for node, plink in boundaries.items()
+                            ))
         
     def multi_access_network(self, layer):
         # we create the virtual connnections at layer 2 and 3, that is the 
@@ -232,17 +250,19 @@ class Network(Graph):
         vc_type = 'l{layer}vc'.format(layer = layer)
         
         for ma_network in self.ma_segments[layer]:
-            for source_plink, node in ma_network:
-                allowed_neighbors = ma_network - {(source_plink, node)}
-                for destination_plink, neighbor in allowed_neighbors:
-                    if not self.is_connected(node, neighbor, link_type, vc_type):
-                        vc = self.lf(
-                                     source = node, 
-                                     destination = neighbor, 
-                                     subtype = vc_type
-                                     )
-                        vc('link', node, source_plink)
-                        vc('link', neighbor, destination_plink)
+            # each pair of boundaries is considered once, in the order of the
+            # segment, instead of building the segment minus the current 
+            # boundary for each of them
+            for (source_plink, node), (destination_plink, neighbor) in \
+                                                combinations(ma_network, 2):
+                if not self.is_connected(node, neighbor, link_type, vc_type):
+                    vc = self.lf(
+                                 source = node, 
+                                 destination = neighbor, 
+                                 subtype = vc_type
+                                 )
+                    vc('link', node, source_plink)
+                    vc('link', neighbor, destination_plink)
                         
     def vc_creation(self):
         # clear all existing multi-access segments
@@ -255,6 +275,7 @@ class Network(Graph):
     def clear_ip(self):
         # remove all existing IP addresses
         self.ip_to_oip.clear()
+        self.pending_ips.clear()
         # reset all traffic links source and destination IP as new IP will
         # be assigned
         for traffic in self.traffics.values():
@@ -266,7 +287,9 @@ class Network(Graph):
         # we first sort all subnetworks in increasing order of size, then
         # compute which subnet is needed
         subnetworks = sorted(list(self.ma_segments[3]), key=len)
-        subnetwork_ip = '10.0.0.0'
+        # the address of the current subnetwork is kept as an integer: it is 
+        # converted to a string once per IP address, but never parsed back
+        subnetwork_ip = toip('10.0.0.0')
         while subnetworks:
             # we retrieve the biggest subnetwork not yet treated
             subnetwork = subnetworks.pop()
@@ -275,12 +298,12 @@ class Network(Graph):
             size = ceil(log(len(subnetwork) + 2, 2))
             subnet = 32 - size
             for idx, (plink, node) in enumerate(subnetwork, 1):
-                curr_ip = ip_incrementer(subnetwork_ip, idx)
+                curr_ip = tostring(subnetwork_ip + idx)
                 ip_addr = IPAddress(curr_ip, subnet, plink('interface', node))
                 self.ip_to_oip[str(ip_addr)] = ip_addr
                 plink('ip_address', node, ip_addr)
                 plink.subnetwork = ip_addr.network
-            subnetwork_ip = ip_incrementer(subnetwork_ip, 2**size)
+            subnetwork_ip += 2**size
             
         # allocate loopback address using the 192.168.0.0/16 private 
         # address space
@@ -295,13 +318,16 @@ class Network(Graph):
         # xE:xx:xx:xx:xx:xx
         
         # allocation of mac_x2 and mac_x6 for interfaces MAC address
-        mac_x2, mac_x6 = '020000000000', '060000000000'
+        # the base addresses are kept as integers (no parsing of the 
+        # hexadecimal string for each physical link), and the colons are 
+        # inserted with fixed slices instead of a generator over range
+        mac_x2, mac_x6 = 0x020000000000, 0x060000000000
+        def to_mac(value):
+            m = '{:012X}'.format(value)
+            return ':'.join((m[0:2], m[2:4], m[4:6], m[6:8], m[8:10], m[10:]))
         for id, plink in enumerate(self.plinks.values(), 1):
-            macS, macD = mac_incrementer(mac_x2, id), mac_incrementer(mac_x6, id)
-            source_mac = ':'.join(macS[i:i+2] for i in range(0, 12, 2))
-            destination_mac = ':'.join(macD[i:i+2] for i in range(0, 12, 2))
-            plink.interfaceS.mac_address = source_mac
-            plink.interfaceD.mac_address = destination_mac
+            plink.interfaceS.mac_address = to_mac(mac_x2 + id)
+            plink.interfaceD.mac_address = to_mac(mac_x6 + id)
             
         # allocation of mac_xA for switches base (hardware) MAC address
         mac_xA = '0A0000000000'
@@ -333,9 +359,8 @@ class Network(Graph):
     # induces this value.
     def plink_dimensioning(self):
         # we need to remove all failures before dimensioning the physical links:
-        # the set of failed physical link will be redefined, but we also need the
-        # icons to be cleaned from the canvas
-        self.view.remove_failures()
+        # the set of failed physical link will be redefined
+        self.failed_obj.clear()
         
         # we consider each physical link in the network to be failed, one by one
         for failed_plink in self.plinks.values():
@@ -344,26 +369,129 @@ class Network(Graph):
             # then use the path finding procedure to map the traffic flows
             self.routing_table_creation()
             self.path_finder()
+            # the worst case traffic is updated with direct attribute accesses
+            # rather than with getattr / setattr on concatenated names
+            failure = str(failed_plink)
             for plink in self.plinks.values():
-                for dir in ('SD', 'DS'):
-                    curr_traffic = getattr(plink, 'traffic' + dir)
-                    if curr_traffic > getattr(plink, 'wctraffic' + dir):
-                        setattr(plink, 'wctraffic' + dir, curr_traffic)
-                        setattr(plink, 'wcfailure', str(failed_plink))
+                if plink.trafficSD > plink.wctrafficSD:
+                    plink.wctrafficSD = plink.trafficSD
+                    plink.wcfailure = failure
+                if plink.trafficDS > plink.wctrafficDS:
+                    plink.wctrafficDS = plink.trafficDS
+                    plink.wcfailure = failure
         self.failed_obj.clear()
-                    
+
+    # same dimensioning, but the traffic flows are not all mapped again for
+    # each failure: a traffic can only be rerouted by the failure of one of the
+    # physical links of its nominal path, or of the physical link of its 
+    # destination subnet. For all other traffics, we reuse the bandwidth 
+    # they put on each physical link in the nominal case.
+    def plink_dimensioning_fast(self):
+        self.failed_obj.clear()
+        self.routing_table_creation()
+        self.reset_traffic()
+
+        # nominal routing: we store the bandwidth each traffic puts on each
+        # physical link of its path, and build an inverted index that
+        # associates a physical link to the traffics that are using it
+        contribution, affected, last = {}, defaultdict(list), {}
+        routed = [
+                  traffic for traffic in self.traffics.values()
+                  if traffic.source.subtype == 'router'
+                  and traffic.destination.subtype == 'router'
+                  ]
+        # a traffic is also rerouted by the failure of a physical link that 
+        # is not on its path, if its destination subnet is the subnet of that
+        # physical link: the subnet is withdrawn from the routing tables
+        subnet_plinks = defaultdict(set)
+        for plink in self.plinks.values():
+            for interface in (plink.interfaceS, plink.interfaceD):
+                ip_address = getattr(interface, 'ip_address', None)
+                subnet_plinks[getattr(ip_address, 'network', None)].add(plink)
+        for traffic in routed:
+            self.RFT_path_finder(traffic)
+            contribution[traffic] = []
+            for obj in traffic.path:
+                if obj.type != 'plink':
+                    continue
+                # only the physical links of the path are updated by
+                # RFT_path_finder: the difference with the last value we
+                # recorded is what the traffic put on the physical link
+                SD, DS = last.get(obj, (0., 0.))
+                contribution[traffic].append((
+                                              obj,
+                                              obj.trafficSD - SD,
+                                              obj.trafficDS - DS
+                                              ))
+                last[obj] = (obj.trafficSD, obj.trafficDS)
+                affected[obj].append(traffic)
+            destination_subnet = getattr(traffic.destination_IP, 'network', None)
+            for plink in subnet_plinks.get(destination_subnet, ()):
+                if traffic not in affected[plink]:
+                    affected[plink].append(traffic)
+        nominal_paths = {traffic: traffic.path for traffic in routed}
+        nominal_traffic = {
+                           plink: (plink.trafficSD, plink.trafficDS)
+                           for plink in self.plinks.values()
+                           }
+
+        for failed_plink in self.plinks.values():
+            self.failed_obj = {failed_plink}
+            rerouted = affected[failed_plink]
+            if rerouted:
+                # the routing tables must be recreated, but only the traffics
+                # that were using the failed physical link are mapped again
+                self.routing_table_creation()
+                self.reset_traffic()
+                for traffic in routed:
+                    if traffic in rerouted:
+                        continue
+                    for plink, SD, DS in contribution[traffic]:
+                        plink.trafficSD += SD
+                        plink.trafficDS += DS
+                for traffic in rerouted:
+                    self.RFT_path_finder(traffic)
+            else:
+                for plink, (SD, DS) in nominal_traffic.items():
+                    plink.trafficSD, plink.trafficDS = SD, DS
+            failure = str(failed_plink)
+            for plink in self.plinks.values():
+                if plink.trafficSD > plink.wctrafficSD:
+                    plink.wctrafficSD = plink.trafficSD
+                    plink.wcfailure = failure
+                if plink.trafficDS > plink.wctrafficDS:
+                    plink.wctrafficDS = plink.trafficDS
+                    plink.wcfailure = failure
+
+        # we restore the nominal routing tables, paths and traffic
+        self.failed_obj.clear()
+        self.routing_table_creation()
+        for traffic, path in nominal_paths.items():
+            traffic.path = path
+        for plink, (SD, DS) in nominal_traffic.items():
+            plink.trafficSD, plink.trafficDS = SD, DS
+
     # this function creates both the ARP and the RARP tables
     def arpt_creation(self):
         # clear the existing ARP tables
         for router in self.ftr('node', 'router'):
             router.arpt.clear()
         for l3_segments in self.ma_segments[3]:
+            # the IP and MAC addresses of the segment's interfaces are 
+            # retrieved once per segment, instead of once per pair of routers
+            remote_addresses = [
+                                (
+                                 plinkB('ip_address', routerB), 
+                                 plinkB('mac_address', routerB)
+                                 )
+                                for plinkB, routerB in l3_segments
+                                ]
             for (plinkA, routerA) in l3_segments:
-                for (plinkB, routerB) in l3_segments: 
-                    remote_ip = plinkB('ip_address', routerB)
-                    remote_mac = plinkB('mac_address', routerB)
-                    outgoing_if = plinkA('name', routerA)
-                    routerA.arpt[remote_ip] = (remote_mac, outgoing_if)
+                outgoing_if = plinkA('name', routerA)
+                routerA.arpt.update(
+                                    (remote_ip, (remote_mac, outgoing_if))
+                                    for remote_ip, remote_mac in remote_addresses
+                                    )
             
     def STP_update(self):
         for AS in self.ASftr('subtype', 'STP'):
@@ -375,8 +503,11 @@ class Network(Graph):
         for switch in self.ftr('node', 'switch'):
             switch.st.clear()
         for AS in self.ASftr('subtype', 'STP'):
+            # the physical links blocked by the spanning tree are the same for
+            # all switches of the AS: the difference is computed once per AS
+            blocked_plinks = AS.pAS['link'] - AS.SPT_links
             for switch in AS.nodes:
-                self.ST_builder(switch, AS.pAS['link'] - AS.SPT_links)
+                self.ST_builder(switch, blocked_plinks)
         # if the switch isn't part of an STP AS, we build its switching table
         # without excluding any physical link
         for switch in self.ftr('node', 'switch'):
@@ -427,14 +558,19 @@ class Network(Graph):
                     heappush(heap, (neighbor, path_node + [neighbor], 
                                             path_plink + [adj_plink], ex_int))
                     
+            # ex_int is the interface of the first physical link of the path 
+            # at the source: it is carried in the heap instead of being 
+            # retrieved again from that physical link
             if path_plink:
-                plink, ex_tk = path_plink[-1], path_plink[0]
-                source.st[plink.interfaceS.mac_address] = ex_tk('interface', source)
-                source.st[plink.interfaceD.mac_address] = ex_tk('interface', source)
+                plink = path_plink[-1]
+                source.st[plink.interfaceS.mac_address] = ex_int
+                source.st[plink.interfaceD.mac_address] = ex_int
     
     ## 1) RFT-based routing and dimensioning
     
-    def RFT_path_finder(self, traffic):
+    # the description of each hop ('path_str') is only built if 'describe'
+    # is True: formatting it is useless when mapping all traffic flows
+    def RFT_path_finder(self, traffic, describe=False):
         source, destination = traffic.source, traffic.destination
         src_ip, dst_ip = traffic.source_IP, traffic.destination_IP
         valid = bool(src_ip) & bool(dst_ip)
@@ -471,7 +607,7 @@ class Network(Graph):
                 for idx, route in enumerate(routes):
                     _, nh_ip, ex_int, _, router, ex_tk = route
                     # we create a new dataflow based on the old one
-                    new_dataflow = copy(dataflow)
+                    new_dataflow = dataflow.clone()
                     # the throughput depends on the number of ECMP routes
                     new_dataflow.throughput /= len(routes) - failed_plinks
                     # the source MAC address is the MAC address of the interface
@@ -482,14 +618,18 @@ class Network(Graph):
                     # we take the first element as the ARP table is built as 
                     # a mapping IP <-> (MAC, outgoing interface)
                     new_dataflow.dst_mac = curr_node.arpt[nh_ip][0]
-                    sd = (curr_node == ex_tk.source)*'SD' or 'DS'
-                    ex_tk.__dict__['traffic' + sd] += new_dataflow.throughput
+                    # the next-hop is the node at the end of the exit physical
+                    # link, and the traffic is added in that direction
+                    if curr_node == ex_tk.source:
+                        ex_tk.trafficSD += new_dataflow.throughput
+                        next_hop = ex_tk.destination
+                    else:
+                        ex_tk.trafficDS += new_dataflow.throughput
+                        next_hop = ex_tk.source
                     # add the exit physical link to the path
                     path.add(ex_tk)
-                    # the next-hop is the node at the end of the exit physical link
-                    next_hop = ex_tk.source if sd == 'DS' else ex_tk.destination
                     heap.append((next_hop, ex_tk, new_dataflow))
-                    if not idx:
+                    if describe and not idx:
                         path_str.append('''
                 Current_node: {curr_node}
                 Next-hop: {next_hop}
@@ -518,7 +658,8 @@ class Network(Graph):
                 else:
                     next_hop = ex_tk.source
                 heap.append((next_hop, ex_tk, dataflow))
-                path_str.append('''
+                if describe:
+                    path_str.append('''
                 Current_node: {curr_node}
                 Next-hop: {next_hop}
                 Outgoing physical link: {ex_tk}
@@ -528,7 +669,6 @@ class Network(Graph):
                                                 ex_tk = ex_tk,
                                                 ex_int = ex_int
                                                 ))
-        print(path)
         traffic.path = path
         return path, path_str
         
@@ -556,9 +696,13 @@ class Network(Graph):
         self.STP_update()
         self.st_creation()
         
+    # ip_allocation sets the subnetwork of the physical links directly: only
+    # the IP addresses created afterwards (OIPf) need to be processed, instead
+    # of all IP addresses for each routing table creation
     def subnetwork_update(self):
-        for ip in self.ip_to_oip.values():
+        for ip in self.pending_ips:
             ip.interface.link.subnetwork = ip.network
+        self.pending_ips.clear()
         
     def routing_table_creation(self):
         self.subnetwork_update()
@@ -586,40 +730,67 @@ class Network(Graph):
                  allowed_plinks = None, 
                  allowed_nodes = None
                  ):
-        
-        if allowed_plinks is None:
-            allowed_plinks = set(self.plinks.values())
+            
+        # the search runs on the CSR snapshot of the graph: nodes are 
+        # identified by their index, and distances and predecessors are 
+        # stored in lists, which avoids hashing node objects
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        nodes, index, n = self.csr_nodes, self.csr_index, len(self.csr_nodes)
+        # when no restriction is given, all nodes are allowed and the
+        # physical links are not checked in the inner loop
         if allowed_nodes is None:
-            allowed_nodes = set(self.nodes.values())
-        
-        prec_node = {i: None for i in allowed_nodes}
-        prec_plink = {i: None for i in allowed_nodes}
-        visited = set()
-        dist = {i: float('inf') for i in allowed_nodes}
-        dist[source] = 0
-        heap = [(0, source)]
+            allowed = bytearray(b'\x01')*n
+        else:
+            allowed = bytearray(n)
+            for node in allowed_nodes:
+                allowed[index[node.id]] = 1
+        check_plinks = allowed_plinks is not None
+        
+        start = index[source.id]
+        prec_node, prec_plink = [None]*n, [None]*n
+        dist = [float('inf')]*n
+        dist[start] = 0
+        heap = [(0, start)]
         while heap:
-            dist_node, node = heappop(heap) 
-            if node not in visited:
-                visited.add(node)
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
-                    # we ignore what's not allowed (not in the AS or in failure)
-                    if neighbor not in allowed_nodes:
-                        continue
-                    if adj_plink not in allowed_plinks:
-                        continue
-                    dist_neighbor = dist_node + adj_plink('cost', node)
-                    if dist_neighbor < dist[neighbor]:
-                        dist[neighbor] = dist_neighbor
-                        prec_node[neighbor] = node
-                        prec_plink[neighbor] = adj_plink
-                        heappush(heap, (dist_neighbor, neighbor))
+            dist_node, i = heappop(heap) 
+            # lazy deletion: an entry is outdated if a shorter distance was
+            # found after it was pushed, there is no need for a visited set
+            if dist_node > dist[i]:
+                continue
+            for k in range(indptr[i], indptr[i+1]):
+                j, adj_plink = indices[k], links[k]
+                # we ignore what's not allowed (not in the AS or in failure)
+                if not allowed[j]:
+                    continue
+                if check_plinks and adj_plink not in allowed_plinks:
+                    continue
+                # the cost is read in the direction of the search, without
+                # going through the link __call__ function
+                if source_side[k]:
+                    dist_neighbor = dist_node + adj_plink.costSD
+                else:
+                    dist_neighbor = dist_node + adj_plink.costDS
+                if dist_neighbor < dist[j]:
+                    dist[j] = dist_neighbor
+                    prec_node[j] = i
+                    prec_plink[j] = adj_plink
+                    heappush(heap, (dist_neighbor, j))
                         
         # traceback the path from target to source
-        curr, path_plink = target, [prec_plink[target]]
-        while curr != source:
+        # the path is built from its end, hence a deque for 'appendleft'
+        curr, path_plink = index[target.id], deque()
+        while prec_node[curr] is not None:
+            path_plink.appendleft(prec_plink[curr])
             curr = prec_node[curr]
-            path_plink.append(prec_plink[curr])
+            
+        # distances are returned for all allowed nodes (and the source)
+        dist = {
+                nodes[i]: dist[i] 
+                for i in range(n) 
+                if allowed[i] or i == start
+                }
                         
         # we return:
         # - the dist dictionnary, that contains the distance from the source
@@ -627,7 +798,7 @@ class Network(Graph):
         # - the shortest path from source to target
         # - all edges that belong to the Shortest Path Tree
         # we need all three variables for Suurbale algorithm below
-        return dist, path_plink[:-1][::-1], filter(None, prec_plink.values())
+        return dist, list(path_plink), filter(None, prec_plink)
         
     ## 2) A* algorithm for CSPF modelization
             
@@ -649,39 +820,79 @@ class Network(Graph):
             excluded_plinks = set()
         if path_constraints is None:
             path_constraints = []
-        if allowed_plinks is None:
-            allowed_plinks = set(self.plinks.values())
+            
+        # the search runs on the CSR snapshot of the graph, like dijkstra: 
+        # usable and visited nodes are bytearrays indexed by CSR index.
+        # the usable physical links are computed once, and not checked at 
+        # all if there is no restriction on them
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        csr_nodes, index, n = self.csr_nodes, self.csr_index, len(self.csr_nodes)
         if allowed_nodes is None:
-            allowed_nodes = set(self.nodes.values())
+            usable = bytearray(b'\x01')*n
+        else:
+            usable = bytearray(n)
+            for node in allowed_nodes:
+                usable[index[node.id]] = 1
+        for node in excluded_nodes:
+            usable[index[node.id]] = 0
+        if allowed_plinks is None and not excluded_plinks:
+            usable_plinks = None
+        else:
+            if allowed_plinks is None:
+                allowed_plinks = set(self.plinks.values())
+            usable_plinks = allowed_plinks - excluded_plinks
             
         pc = [target] + path_constraints[::-1]
-        visited = set()
-        heap = [(0, source, [source], [], pc)]
+        # the paths are not copied in the heap: a heap entry only contains the
+        # node it comes from and the physical link it was reached with, and 
+        # the predecessors are stored in 'prec' when a node is visited.
+        # the search is restarted from each path constraint: 'start' is the 
+        # node from which the current search started, and 'nodes' / 'plinks'
+        # the path found up to that node.
+        # heap entries also contain the CSR index of the node: it comes last,
+        # so that ties are still broken on the node objects
+        nodes, plinks = [source], []
+        visited, prec, start = bytearray(n), {}, source
+        heap = [(0, source, None, None, index[source.id])]
         while heap:
-            dist, node, nodes, plinks, pc = heappop(heap)
-            if node not in visited:
-                visited.add(node)
+            dist, node, parent, plink, i = heappop(heap)
+            if not visited[i]:
+                visited[i] = 1
+                if parent is not None:
+                    prec[node] = (parent, plink)
                 if node == pc[-1]:
-                    visited.clear()
+                    # traceback the path from the constraint to the start of
+                    # the current search (which may have been visited again 
+                    # through a loop, if it is itself the constraint)
+                    curr, stage_nodes, stage_plinks = node, [], []
+                    while curr != start or not stage_plinks and curr in prec:
+                        stage_nodes.append(curr)
+                        curr, prec_plink = prec[curr]
+                        stage_plinks.append(prec_plink)
+                    nodes.extend(reversed(stage_nodes))
+                    plinks.extend(reversed(stage_plinks))
+                    visited = bytearray(n)
+                    prec.clear()
                     heap.clear()
                     pc.pop()
+                    start = node
                     if not pc:
                         return nodes, plinks
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
+                for k in range(indptr[i], indptr[i+1]):
+                    j, adj_plink = indices[k], links[k]
                     # excluded and allowed nodes
-                    if neighbor not in allowed_nodes - excluded_nodes: 
+                    if not usable[j]: 
                         continue
                     # excluded and allowed physical links
-                    if adj_plink not in allowed_plinks - excluded_plinks: 
+                    if usable_plinks is not None and adj_plink not in usable_plinks: 
                         continue
-                    heappush(heap, (
-                                    dist + adj_plink('cost', node), 
-                                    neighbor,
-                                    nodes + [neighbor], 
-                                    plinks + [adj_plink], 
-                                    pc
-                                    )
-                            )
+                    if source_side[k]:
+                        cost = adj_plink.costSD
+                    else:
+                        cost = adj_plink.costDS
+                    heappush(heap, (dist + cost, csr_nodes[j], node, adj_plink, j))
         return [], []
 
     ## 3) Bellman-Ford algorithm
@@ -702,46 +913,92 @@ class Network(Graph):
             excluded_nodes = set()
         if excluded_plinks is None:
             excluded_plinks = set()
-        if allowed_plinks is None:
-            allowed_plinks = set(self.plinks.values())
+        
+        # the relaxation runs on the CSR snapshot: the usable edges of each 
+        # node are extracted once, with the CSR index of the neighbor and the 
+        # cost already resolved in the direction of the relaxation. Distances
+        # and predecessors are lists indexed by CSR index.
+        # like in A*, allowed and usable nodes are bytearrays indexed by CSR
+        # index, computed once, and the physical links are not checked at 
+        # all if there is no restriction on them
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        nodes, index = self.csr_nodes, self.csr_index
         if allowed_nodes is None:
-            allowed_nodes = set(self.nodes.values())
-
-        n = len(allowed_nodes)
-        prec_node = {i: None for i in allowed_nodes}
-        prec_plink = {i: None for i in allowed_nodes}
-        dist = {i: float('inf') for i in allowed_nodes}
-        dist[source] = 0
-        
-        for i in range(n+2):
-            negative_cycle = False
+            allowed = bytearray(b'\x01')*len(nodes)
+        else:
+            allowed = bytearray(len(nodes))
             for node in allowed_nodes:
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
-                    sd = (node == adj_plink.source)*'SD' or 'DS'
-                    # excluded and allowed nodes
-                    if neighbor not in allowed_nodes - excluded_nodes: 
-                        continue
-                    # excluded and allowed physical links
-                    if adj_plink not in allowed_plinks - excluded_plinks: 
-                        continue
-                    dist_neighbor = dist[node] + getattr(adj_plink, 'cost' + sd)
-                    if dist_neighbor < dist[neighbor]:
-                        dist[neighbor] = dist_neighbor
-                        prec_node[neighbor] = node
-                        prec_plink[neighbor] = adj_plink
+                allowed[index[node.id]] = 1
+        usable = bytearray(allowed)
+        for node in excluded_nodes:
+            usable[index[node.id]] = 0
+        if allowed_plinks is None and not excluded_plinks:
+            usable_plinks = None
+        else:
+            if allowed_plinks is None:
+                allowed_plinks = set(self.plinks.values())
+            usable_plinks = allowed_plinks - excluded_plinks
+            
+        edges = [[] for _ in nodes]
+        for i in range(len(nodes)):
+            if not allowed[i]:
+                continue
+            for k in range(indptr[i], indptr[i+1]):
+                j, adj_plink = indices[k], links[k]
+                if not usable[j]:
+                    continue
+                if usable_plinks is not None and adj_plink not in usable_plinks:
+                    continue
+                cost = adj_plink.costSD if source_side[k] else adj_plink.costDS
+                edges[i].append((j, adj_plink, cost))
+
+        n = allowed.count(1)
+        start, end = index[source.id], index[target.id]
+        prec_node, prec_plink = [None]*len(nodes), [None]*len(nodes)
+        dist = [float('inf')]*len(nodes)
+        dist[start] = 0
+        
+        # SPFA (Shortest Path Faster Algorithm): only the edges of the nodes
+        # whose distance was updated are relaxed. 'length' is the number of 
+        # physical links of the current shortest path to each node: a path
+        # of n physical links goes through a node twice, i.e the node 
+        # belongs to, or can be reached from, a negative cycle. The number 
+        # of relaxations cannot be used instead: with parallel physical 
+        # links or several predecessors, a node can be lowered several 
+        # times in a single pass.
+        queue, in_queue = deque([start]), bytearray(len(nodes))
+        length = [0]*len(nodes)
+        in_queue[start], negative_cycle = 1, False
+        while queue and not negative_cycle:
+            i = queue.popleft()
+            in_queue[i] = 0
+            for j, adj_plink, cost in edges[i]:
+                dist_neighbor = dist[i] + cost
+                if dist_neighbor < dist[j]:
+                    dist[j] = dist_neighbor
+                    prec_node[j] = i
+                    prec_plink[j] = adj_plink
+                    length[j] = length[i] + 1
+                    if length[j] >= n:
                         negative_cycle = True
-                        
+                        break
+                    if not in_queue[j]:
+                        in_queue[j] = 1
+                        queue.append(j)
+                    
         # traceback the path from target to source
-        if dist[target] != float('inf') and not cycle:
-            curr, path_node, path_plink = target, [target], [prec_plink[target]]
-            while curr != source:
+        if dist[end] != float('inf') and not cycle:
+            curr, path_node, path_plink = end, deque([end]), deque()
+            while curr != start:
+                path_plink.appendleft(prec_plink[curr])
                 curr = prec_node[curr]
-                path_plink.append(prec_plink[curr])
-                path_node.append(curr)
-            return path_node[::-1], path_plink[:-1][::-1]
+                path_node.appendleft(curr)
+            return [nodes[i] for i in path_node], list(path_plink)
         # if we want a cycle, and one exists, we find it
         if cycle and negative_cycle:
-                curr, path_node, path_plink = target, [target], [prec_plink[target]]
+                curr, path_node, path_plink = end, [end], [prec_plink[end]]
                 # return the cycle itself (for the cycle cancelling algorithm) 
                 # starting from the target, we go through the predecessors 
                 # we find any cycle (we don't necessarily have to come back to
@@ -750,56 +1007,181 @@ class Network(Graph):
                     curr = prec_node[curr]
                     path_plink.append(prec_plink[curr])
                     path_node.append(curr)
-                return path_node[::-1], path_plink[:-1][::-1]
+                return ([nodes[i] for i in path_node[::-1]], 
+                                            path_plink[:-1][::-1])
         # if we didn't find a path, and were not looking for a cycle, 
         # we return empty lists
         return [], []
+        
+    # tells whether there is a negative cycle anywhere in the graph, with a 
+    # single SPFA run from a virtual super-source linked to every node with 
+    # a zero-cost edge: the super-source is not added to the graph, all 
+    # nodes simply start at distance 0 in the queue
+    def has_negative_cycle(self):
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        n = len(self.csr_nodes)
+        dist = [0]*n
+        # like in bellman_ford, a negative cycle is detected when a shortest
+        # path has n physical links (the zero-cost edges from the 
+        # super-source are not counted)
+        length = [0]*n
+        queue, in_queue = deque(range(n)), bytearray(b'\x01')*n
+        while queue:
+            i = queue.popleft()
+            in_queue[i] = 0
+            for k in range(indptr[i], indptr[i+1]):
+                j, adj_plink = indices[k], links[k]
+                cost = adj_plink.costSD if source_side[k] else adj_plink.costDS
+                if dist[i] + cost < dist[j]:
+                    dist[j] = dist[i] + cost
+                    length[j] = length[i] + 1
+                    if length[j] >= n:
+                        return True
+                    if not in_queue[j]:
+                        in_queue[j] = 1
+                        queue.append(j)
+        return False
             
     ## 4) Floyd-Warshall algorithm
             
-    def floyd_warshall(self):
-        nodes = list(self.nodes.values())
-        n = len(nodes)
-        W = [[0]*n for _ in range(n)]
-        
-        for id1, n1 in enumerate(nodes):
-            for id2, n2 in enumerate(nodes):
-                if id1 != id2:
-                    for neighbor, plink in self.graph[n1.id]['plink']:
-                        if neighbor == n2:
-                            W[id1][id2] = plink.costSD
-                            break
+    # matrix of the physical link costs, indexed like the CSR snapshot: row
+    # i contains the neighbors of the node at index i, and the minimum cost 
+    # is kept for parallel physical links. The cost is read in the direction
+    # of the row node, unless 'directional' is False (costSD both ways).
+    # Without numpy, the matrix is a list of lists: both can be indexed 
+    # with W[i][j]
+    def cost_matrix(self, directional=True):
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        n = len(self.csr_nodes)
+        if not numpy_available:
+            source_side = self.csr_source['plink']
+            W = [[float('inf')]*n for _ in range(n)]
+            for i, row in enumerate(W):
+                for k in range(indptr[i], indptr[i + 1]):
+                    plink = links[k]
+                    if not directional or source_side[k]:
+                        cost = plink.costSD
                     else:
-                        W[id1][id2] = float('inf')
+                        cost = plink.costDS
+                    row[indices[k]] = min(row[indices[k]], cost)
+                row[i] = 0
+            return W
+        W = np.full((n, n), float('inf'))
+        
+        rows = np.repeat(np.arange(n), np.diff(np.frombuffer(indptr, dtype=np.intc)))
+        cols = np.frombuffer(indices, dtype=np.intc)
+        if directional:
+            costs = np.fromiter(
+                                (
+                                plink.costSD if source_side else plink.costDS
+                                for plink, source_side 
+                                in zip(links, self.csr_source['plink'])
+                                ), 
+                                float, 
+                                len(links)
+                                )
+        else:
+            costs = np.fromiter((plink.costSD for plink in links), float, len(links))
+        np.minimum.at(W, (rows, cols), costs)
+        np.fill_diagonal(W, 0)
+        return W
+            
+    # returns the matrix of all shortest path lengths, and a dictionary
+    # that maps each node to its index in the matrix
+    def floyd_warshall(self, directional=False):
+        W = self.cost_matrix(directional)
+        node_to_idx = {node: idx for idx, node in enumerate(self.csr_nodes)}
+        
+        # scipy runs the triple loop in compiled code; the graph is built 
+        # with inf as the null value so that zero-cost links are kept
+        if scipy_available:
+            graph = csgraph.csgraph_from_dense(W, null_value=np.inf)
+            try:
+                W = csgraph.floyd_warshall(graph, directed=True)
+            except csgraph.NegativeCycleError:
+                return False
+            return W, node_to_idx
                         
-        for k in range(n):
-            for u in range(n):
-                for v in range(n):
-                    W[u][v] = min(W[u][v], W[u][k] + W[k][v])
+        if not numpy_available:
+            n = len(W)
+            for k in range(n):
+                row_k = W[k]
+                for row in W:
+                    w_uk = row[k]
+                    if w_uk == float('inf'):
+                        continue
+                    for v in range(n):
+                        if w_uk + row_k[v] < row[v]:
+                            row[v] = w_uk + row_k[v]
+            if any(W[v][v] < 0 for v in range(n)):
+                return False
+            return W, node_to_idx
+                        
+        # for each intermediate node k, all (u, v) pairs are relaxed at once
+        for k in range(len(W)):
+            np.minimum(W, W[:, k:k+1] + W[k:k+1, :], out=W)
                     
-        if any(W[v][v] < 0 for v in range(n)):
+        if (np.diag(W) < 0).any():
             return False
-        else:
-            all_length = defaultdict(dict)
-            for id1, n1 in enumerate(nodes):
-                for id2, n2 in enumerate(nodes):
-                    all_length[n1][n2] = W[id1][id2]
                     
-        return all_length  
+        return W, node_to_idx
+        
+    ## 5) All-pairs shortest paths
+    
+    # like floyd_warshall, these functions return the matrix of all shortest 
+    # path lengths (with directional costs) and the node to index mapping. 
+    # With scipy, all sources are processed in a single compiled call, and
+    # without numpy, the matrix is a list of lists. 
+    
+    def all_pairs_dijkstra(self):
+        W = self.cost_matrix()
+        node_to_idx = {node: idx for idx, node in enumerate(self.csr_nodes)}
+        if scipy_available:
+            graph = csgraph.csgraph_from_dense(W, null_value=np.inf)
+            return csgraph.dijkstra(graph, directed=True), node_to_idx
+        # without scipy, dijkstra is run from each node
+        if numpy_available:
+            all_length = np.full_like(W, float('inf'))
+        else:
+            all_length = [[float('inf')]*len(W) for _ in W]
+        for source, i in node_to_idx.items():
+            dist, _, _ = self.dijkstra(source, source)
+            for node, length in dist.items():
+                all_length[i][node_to_idx[node]] = length
+        return all_length, node_to_idx
+        
+    # negative costs are allowed: False is returned if there is a negative
+    # cycle. scipy uses Johnson algorithm (a single Bellman-Ford run to 
+    # reweight the physical links, then Dijkstra from each node), and 
+    # floyd_warshall is used without scipy
+    def all_pairs_bellman_ford(self):
+        if not scipy_available:
+            return self.floyd_warshall(directional=True)
+        W = self.cost_matrix()
+        node_to_idx = {node: idx for idx, node in enumerate(self.csr_nodes)}
+        graph = csgraph.csgraph_from_dense(W, null_value=np.inf)
+        try:
+            return csgraph.johnson(graph, directed=True), node_to_idx
+        except csgraph.NegativeCycleError:
+            return False
         
-    ## 5) DFS (all loop-free paths)
+    ## 6) DFS (all loop-free paths)
         
     def all_paths(self, source, target=None):
         # generates all loop-free paths from source to optional target
         path = [source]
         seen = {source}
+        graph = self.graph
         def find_all_paths():
             dead_end = True
             node = path[-1]
             if node == target:
                 yield list(path)
             else:
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
+                for neighbor, adj_plink in graph[node.id]['plink']:
                     if neighbor not in seen:
                         dead_end = False
                         seen.add(neighbor)
@@ -819,40 +1201,85 @@ class Network(Graph):
         # To find the shortest pair from the source to the target, we look
         # for the shortest path going from the source to the source, with 
         # the target as a 'path constraint'.
-        # Each path is stored with sets of allowed nodes and physical links that will 
-        # contains what belongs to the first path, once we've reached the target.
+        # Each path is stored with the set of physical links that it cannot
+        # use anymore: it contains what belongs to the first path, once 
+        # we've reached the target.
+        # The paths are not copied in the heap: a path is a chain of cells 
+        # (node, physical link, previous cell), which shares its beginning 
+        # with all the paths it was extended from, and the list of physical
+        # links is rebuilt only once, when the target or the source is reached.
         
         # if a_n is None:
         #     a_n = AS.nodes
         # if a_t is None:
         #     a_t = AS.pAS['link']
         
-        if a_t is None:
-            a_t = set(self.plinks.values())
+        # the search runs on the CSR snapshot, like A*: the cells contain the
+        # CSR index of the node, the allowed nodes are a bytearray indexed by
+        # CSR index, and the physical links are not checked against a_t if
+        # there is no restriction on them
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        index, n = self.csr_index, len(self.csr_nodes)
         if a_n is None:
-            a_n = set(self.nodes.values())
-
-        visited = set()
-        # in the heap, we store e_o, the list of excluded objects, which is
-        # empty until we reach the target.
-        heap = [(0, source, [], set())]
+            usable = bytearray(b'\x01')*n
+        else:
+            usable = bytearray(n)
+            for node in a_n:
+                usable[index[node.id]] = 1
+        start, end = index[source.id], index[target.id]
+            
+        def path_plinks(cell):
+            path_plink = deque()
+            while cell[1] is not None:
+                _, plink, cell = cell
+                path_plink.appendleft(plink)
+            return list(path_plink)
+            
+        # before the target is reached, a path that goes through the same 
+        # node twice is ignored: the path without the loop costs less and 
+        # excludes fewer physical links.
+        # once the target is reached, a leg number identifies the first path:
+        # the rest of the search is a shortest path search for each first 
+        # path, and a node is visited only once per leg.
+        visited, legs = set(), count()
+        # the counter breaks ties between heap entries of equal cost
+        order = count()
+        heap = [(0, next(order), (start, None, None), None, frozenset())]
         while heap:
-            dist, node, path_plink, e_o = heappop(heap)  
-            if (node, tuple(path_plink)) not in visited:
-                visited.add((node, tuple(path_plink)))
-                if node == target:
-                    e_o = set(path_plink)
-                if node == source and e_o:
-                    return [], path_plink
-                for neighbor, adj_plink in self.graph[node.id]['plink']:
-                    sd = (node == adj_plink.source)*'SD' or 'DS'
-                    # we ignore what's not allowed (not in the AS or in failure
-                    # or in the path we've used to reach the target)
-                    if neighbor not in a_n or adj_plink not in a_t-e_o:
-                        continue
-                    cost = getattr(adj_plink, 'cost' + sd)
-                    heappush(heap, (dist + cost, neighbor, 
-                                                path_plink + [adj_plink], e_o))
+            dist, _, cell, leg, e_o = heappop(heap)
+            i = cell[0]
+            if leg is None:
+                previous_cell = cell[2]
+                while previous_cell is not None and previous_cell[0] != i:
+                    previous_cell = previous_cell[2]
+                if previous_cell is not None:
+                    continue
+                if i == end:
+                    leg, e_o = next(legs), set(path_plinks(cell))
+            if leg is not None:
+                if (i, leg) in visited:
+                    continue
+                visited.add((i, leg))
+                if i == start:
+                    return [], path_plinks(cell)
+            for k in range(indptr[i], indptr[i+1]):
+                j, adj_plink = indices[k], links[k]
+                # we ignore what's not allowed (not in the AS or in failure
+                # or in the path we've used to reach the target)
+                if not usable[j] or adj_plink in e_o:
+                    continue
+                if a_t is not None and adj_plink not in a_t:
+                    continue
+                cost = adj_plink.costSD if source_side[k] else adj_plink.costDS
+                heappush(heap, (
+                                dist + cost, 
+                                next(order), 
+                                (j, adj_plink, cell), 
+                                leg, 
+                                e_o
+                                ))
         return [], []
         
     ## 2) Bhandari algorithm for link-disjoint shortest pair
@@ -865,16 +1292,15 @@ class Network(Graph):
     # shortest path from source to target
     # - we remove all overlapping physical links
         
-        if a_t is None:
-            a_t = set(self.plinks.values())
-        if a_n is None:
-            a_n = set(self.nodes.values())
+        # when a_n or a_t is None, the search functions are not restricted,
+        # which avoids building a set of all nodes and physical links
+        plinks = self.plinks.values() if a_t is None else a_t
             
         # we store the cost value in the flow parameters, since bhandari 
         # algorithm relies on graph transformation, and the costs of the edges
         # will be modified.
         # at the end, we will revert the cost to their original value
-        for plink in a_t:
+        for plink in plinks:
             plink.flowSD = plink.costSD
             plink.flowDS = plink.costDS
             
@@ -890,11 +1316,12 @@ class Network(Graph):
         # we set the cost to -1.
         current_node = source
         for plink in first_path:
-            dir = 'SD' * (current_node == plink.source) or 'DS'
-            reverse_dir = 'SD' if dir == 'DS' else 'DS'
-            setattr(plink, 'cost' + dir, float('inf'))
-            setattr(plink, 'cost' + reverse_dir, -1)
-            current_node = plink.destination if dir == 'SD' else plink.source
+            if current_node == plink.source:
+                plink.costSD, plink.costDS = float('inf'), -1
+                current_node = plink.destination
+            else:
+                plink.costDS, plink.costSD = float('inf'), -1
+                current_node = plink.source
             
         _, second_path = self.bellman_ford(
                                            source, 
@@ -903,7 +1330,7 @@ class Network(Graph):
                                            allowed_nodes = a_n
                                            )
         
-        for plink in a_t:
+        for plink in plinks:
             plink.costSD = plink.flowSD
             plink.costDS = plink.flowDS
 
@@ -918,16 +1345,15 @@ class Network(Graph):
     # shortest path from source to target
     # - we remove all overlapping physical links
         
-        if a_t is None:
-            a_t = set(self.plinks.values())
-        if a_n is None:
-            a_n = set(self.nodes.values())
+        # when a_n or a_t is None, the search functions are not restricted,
+        # which avoids building a set of all nodes and physical links
+        plinks = self.plinks.values() if a_t is None else a_t
             
         # we store the cost value in the flow parameters, since bhandari 
         # algorithm relies on graph transformation, and the costs of the edges
         # will be modified.
         # at the end, we will revert the cost to their original value
-        for plink in a_t:
+        for plink in plinks:
             plink.flowSD = plink.costSD
             plink.flowDS = plink.costDS
             
@@ -949,9 +1375,12 @@ class Network(Graph):
         # we exclude the edge of the shortest path (infinite cost)
         current_node = source
         for plink in first_path:
-            dir = 'SD' * (current_node == plink.source) or 'DS'
-            setattr(plink, 'cost' + dir, float('inf'))
-            current_node = plink.destination if dir == 'SD' else plink.source
+            if current_node == plink.source:
+                plink.costSD = float('inf')
+                current_node = plink.destination
+            else:
+                plink.costDS = float('inf')
+                current_node = plink.source
             
         _, second_path = self.A_star(
                               source, 
@@ -971,158 +1400,286 @@ class Network(Graph):
     
     ## 1) Ford-Fulkerson algorithm
         
-    def augment_ff(self, val, curr_node, target, visit):
-        visit[curr_node] = True
-        if curr_node == target:
-            return val
-        for neighbor, adj_plink in self.graph[curr_node.id]['plink']:
-            direction = curr_node == adj_plink.source
-            sd, ds = direction*'SD' or 'DS', direction*'DS' or 'SD'
-            cap = getattr(adj_plink, 'capacity' + sd)
-            current_flow = getattr(adj_plink, 'flow' + sd)
-            if cap > current_flow and not visit[neighbor]:
-                residual_capacity = min(val, cap - current_flow)
-                global_flow = self.augment_ff(
-                                              residual_capacity, 
-                                              neighbor, 
-                                              target, 
-                                              visit
-                                              )
-                if global_flow > 0:
-                    adj_plink.__dict__['flow' + sd] += global_flow
-                    adj_plink.__dict__['flow' + ds] -= global_flow
-                    return global_flow
-        return False
+    # the depth-first search for an augmenting path uses an explicit stack
+    # instead of recursion: each entry contains the CSR index of a node, the
+    # CSR position of the next physical link to explore from that node, and
+    # the residual capacity of the path up to that node. 'path' contains the 
+    # CSR positions of the physical links of the path currently explored.
+    def augment_ff(self, source, target):
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        start, end = self.csr_index[source.id], self.csr_index[target.id]
+        visit = bytearray(len(self.csr_nodes))
+        visit[start] = 1
+        stack, path = [(start, indptr[start], float('inf'))], []
+        while stack:
+            i, k, val = stack[-1]
+            if i == end:
+                break
+            # all physical links were explored: this is a dead end
+            if k == indptr[i+1]:
+                stack.pop()
+                if path:
+                    path.pop()
+                continue
+            stack[-1] = (i, k + 1, val)
+            j, adj_plink = indices[k], links[k]
+            if visit[j]:
+                continue
+            if source_side[k]:
+                cap, current_flow = adj_plink.capacitySD, adj_plink.flowSD
+            else:
+                cap, current_flow = adj_plink.capacityDS, adj_plink.flowDS
+            if cap > current_flow:
+                visit[j] = 1
+                path.append(k)
+                stack.append((j, indptr[j], min(val, cap - current_flow)))
+        if not stack:
+            return False
+        global_flow = stack[-1][2]
+        for k in path:
+            adj_plink = links[k]
+            if source_side[k]:
+                adj_plink.flowSD += global_flow
+                adj_plink.flowDS -= global_flow
+            else:
+                adj_plink.flowDS += global_flow
+                adj_plink.flowSD -= global_flow
+        return global_flow
         
     def ford_fulkerson(self, s, d):
         self.reset_flow()
-        while self.augment_ff(float('inf'), s, d, {n:0 for n in self.pn['node'].values()}):
+        self.freeze()
+        while self.augment_ff(s, d):
             pass
         # flow leaving from the source 
-        return sum(
-                  getattr(adj, 'flow' + (s==adj.source)*'SD' or 'DS') 
-                  for _, adj in self.graph[s.id]['plink']
-                  )
+        return sum(adj('flow', s) for _, adj in self.graph[s.id]['plink'])
         
     ## 2) Edmonds-Karp algorithm
         
+    # the BFS runs on the CSR snapshot: for each node, 'augmenting_path' 
+    # contains the CSR index of its predecessor, and 'augmenting_plink' the 
+    # CSR position of the physical link it was reached with, so that the 
+    # augmenting path can be traced back without looking for the links
     def augment_ek(self, source, destination):
-        res_cap = {n:0 for n in self.pn['node'].values()}
-        augmenting_path = {n: None for n in self.pn['node'].values()}
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        index, n = self.csr_index, len(self.csr_nodes)
+        start, end = index[source.id], index[destination.id]
+        res_cap = [0]*n
+        augmenting_path, augmenting_plink = [None]*n, [None]*n
         Q = deque()
-        Q.append(source)
-        augmenting_path[source] = source
-        res_cap[source] = float('inf')
+        Q.append(start)
+        augmenting_path[start] = start
+        res_cap[start] = float('inf')
         while Q:
-            curr_node = Q.popleft()
-            for neighbor, adj_plink in self.graph[curr_node.id]['plink']:
-                direction = curr_node == adj_plink.source
-                sd, ds = direction*'SD' or 'DS', direction*'DS' or 'SD'
-                cap = getattr(adj_plink, 'capacity' + sd)
-                flow = getattr(adj_plink, 'flow' + sd)
-                residual = cap - flow
-                if residual and augmenting_path[neighbor] is None:
-                    augmenting_path[neighbor] = curr_node
-                    res_cap[neighbor] = min(res_cap[curr_node], residual)
-                    if neighbor == destination:
-                        break
-                    else:
-                        Q.append(neighbor)
-        return augmenting_path, res_cap[destination]
+            i = Q.popleft()
+            for k in range(indptr[i], indptr[i+1]):
+                j, adj_plink = indices[k], links[k]
+                if augmenting_path[j] is not None:
+                    continue
+                if source_side[k]:
+                    residual = adj_plink.capacitySD - adj_plink.flowSD
+                else:
+                    residual = adj_plink.capacityDS - adj_plink.flowDS
+                if residual:
+                    augmenting_path[j] = i
+                    augmenting_plink[j] = k
+                    res_cap[j] = min(res_cap[i], residual)
+                    # the rest of the BFS cannot change the path found
+                    if j == end:
+                        return augmenting_path, augmenting_plink, res_cap[j]
+                    Q.append(j)
+        return augmenting_path, augmenting_plink, res_cap[end]
         
     def edmonds_karp(self, source, destination):
         self.reset_flow()
+        self.freeze()
+        links, source_side = self.csr['plink'][2], self.csr_source['plink']
+        start, curr = self.csr_index[source.id], None
         while True:
-            augmenting_path, global_flow = self.augment_ek(source, destination)
+            augmenting_path, augmenting_plink, global_flow = self.augment_ek(
+                                                                source, 
+                                                                destination
+                                                                )
             if not global_flow:
                 break
-            curr_node = destination
-            while curr_node != source:
-                # find the physical link between the two nodes
-                prec_node = augmenting_path[curr_node]
-                find_plink = lambda p: getitem(p, 0) == prec_node
-                (_, plink) ,= filter(find_plink, self.graph[curr_node.id]['plink'])
-                # define sd and ds depending on how the physical link is defined
-                direction = curr_node == plink.source
-                sd, ds = direction*'SD' or 'DS', direction*'DS' or 'SD'
-                plink.__dict__['flow' + ds] += global_flow
-                plink.__dict__['flow' + sd] -= global_flow
-                curr_node = prec_node 
-        return sum(
-                   getattr(adj, 'flow' + ((source==adj.source)*'SD' or 'DS')) 
-                   for _, adj in self.graph[source.id]['plink']
-                  )
+            curr = self.csr_index[destination.id]
+            while curr != start:
+                # the physical link goes from the predecessor to the current
+                # node, in the SD direction if the predecessor is its source
+                k = augmenting_plink[curr]
+                plink = links[k]
+                if source_side[k]:
+                    plink.flowSD += global_flow
+                    plink.flowDS -= global_flow
+                else:
+                    plink.flowDS += global_flow
+                    plink.flowSD -= global_flow
+                curr = augmenting_path[curr]
+        return sum(adj('flow', source) for _, adj in self.graph[source.id]['plink'])
                   
-    ## 2) Dinic algorithm
+    ## 3) Dinic algorithm
     
-    def augment_di(self, level, flow, curr_node, dest, limit):
+    # like Ford-Fulkerson and Edmonds-Karp, Dinic runs on the CSR snapshot:
+    # nodes are CSR indices, levels are stored in a list, and capacities and
+    # flows are read in the direction of the search with the csr_source 
+    # bitmap instead of building the attribute names
+    def augment_di(self, level, flow, i, end, limit):
         if limit <= 0:
             return 0
-        if curr_node == dest:
+        if i == end:
             return limit
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
         val = 0
-        for neighbor, adj_plink in self.graph[curr_node.id]['plink']:
-            direction = curr_node == adj_plink.source
-            sd, ds = direction*'SD' or 'DS', direction*'DS' or 'SD'
-            cap = getattr(adj_plink, 'capacity' + sd)
-            flow = getattr(adj_plink, 'flow' + sd)
-            residual = cap - flow
-            if level[neighbor] == level[curr_node] + 1 and residual > 0:
+        for k in range(indptr[i], indptr[i+1]):
+            j, adj_plink = indices[k], links[k]
+            if source_side[k]:
+                residual = adj_plink.capacitySD - adj_plink.flowSD
+            else:
+                residual = adj_plink.capacityDS - adj_plink.flowDS
+            if level[j] == level[i] + 1 and residual > 0:
                 z = min(limit, residual)
-                aug = self.augment_di(level, flow, neighbor, dest, z)
-                adj_plink.__dict__['flow' + sd] += aug
-                adj_plink.__dict__['flow' + ds] -= aug
+                aug = self.augment_di(level, flow, j, end, z)
+                if source_side[k]:
+                    adj_plink.flowSD += aug
+                    adj_plink.flowDS -= aug
+                else:
+                    adj_plink.flowDS += aug
+                    adj_plink.flowSD -= aug
                 val += aug
                 limit -= aug
         if not val:
-            level[curr_node] = None
+            level[i] = None
         return val
         
     def dinic(self, source, destination):
         self.reset_flow()
+        self.freeze()
+        indptr, indices, links = self.csr['plink']
+        source_side = self.csr_source['plink']
+        start = self.csr_index[source.id]
+        end = self.csr_index[destination.id]
         Q = deque()
         total = 0
+        # the capacities do not change, only the flows: the bound on the 
+        # flow leaving the source is the same for all phases
+        limit = sum(
+                    adj_plink('capacity', source)
+                    for _, adj_plink in self.graph[source.id]['plink']
+                    )
+        # the level list is allocated once, and reset in place at each phase
+        n = len(self.csr_nodes)
+        level, unset = [None]*n, [None]*n
         while True:
-            Q.appendleft(source)
-            level = {node: None for node in self.nodes.values()}
-            level[source] = 0
+            Q.appendleft(start)
+            level[:] = unset
+            level[start] = 0
             while Q:
-                curr_node = Q.pop()
-                for neighbor, adj_plink in self.graph[curr_node.id]['plink']:
-                    direction = curr_node == adj_plink.source
-                    sd = direction*'SD' or 'DS'
-                    cap = getattr(adj_plink, 'capacity' + sd)
-                    flow = getattr(adj_plink, 'flow' + sd)
-                    if level[neighbor] is None and cap > flow:
-                        level[neighbor] = level[curr_node] + 1
-                        Q.appendleft(neighbor)
+                i = Q.pop()
+                for k in range(indptr[i], indptr[i+1]):
+                    j, adj_plink = indices[k], links[k]
+                    if source_side[k]:
+                        cap, flow = adj_plink.capacitySD, adj_plink.flowSD
+                    else:
+                        cap, flow = adj_plink.capacityDS, adj_plink.flowDS
+                    if level[j] is None and cap > flow:
+                        level[j] = level[i] + 1
+                        Q.appendleft(j)
                         
-            if level[destination] is None:
+            if level[end] is None:
                 return flow, total
-            limit = sum(
-                        getattr(adj_plink, 'capacity' + 
-                        ((source == adj_plink.source)*'SD' or 'DS'))
-                        for _, adj_plink in self.graph[source.id]['plink']
-                        )
-            total += self.augment_di(level, flow, source, destination, limit)
+            total += self.augment_di(level, flow, start, end, limit)
+            
+    ## 4) Generic maximum flow
+    
+    # algo can be 'edmonds-karp', 'dinic', or 'auto': Dinic is selected for
+    # dense networks (more than 4 physical links per node), Edmonds-Karp 
+    # otherwise. Any other value raises a ValueError
+    def max_flow(self, source, destination, algo='auto'):
+        if algo == 'auto':
+            dense = len(self.pn['plink']) > 4*len(self.pn['node'])
+            algo = 'dinic' if dense else 'edmonds-karp'
+        if algo == 'dinic':
+            _, total = self.dinic(source, destination)
+            return total
+        elif algo == 'edmonds-karp':
+            return self.edmonds_karp(source, destination)
+        else:
+            raise ValueError('Unknown maximum flow algorithm: {}'.format(algo))
         
     ## Minimum spanning tree algorithms 
     
     ## 1) Kruskal algorithm
         
-    def kruskal(self, allowed_nodes):
+    # sort_method defines how physical links are processed by increasing cost:
+    # - 'array': all physical links are sorted beforehand
+    # - 'heap': the physical links are heapified (linear time), and only those
+    # that are actually needed are popped from the heap
+    def kruskal(self, allowed_nodes, sort_method='array'):
         uf = UnionFind(allowed_nodes)
-        edges = []
+        # allowed_nodes can be a view on the values of a dictionary, for 
+        # which membership is a linear search
+        allowed = set(allowed_nodes)
+        graph, edges = self.graph, []
+        append = edges.append
         for node in allowed_nodes:
-            for neighbor, adj_plink in self.graph[node.id]['plink']:
-                if neighbor in allowed_nodes:
-                    edges.append((adj_plink.costSD, adj_plink, node, neighbor))
-        for w, t, u, v in sorted(edges, key=itemgetter(0)):
+            for neighbor, adj_plink in graph[node.id]['plink']:
+                if neighbor in allowed:
+                    append((adj_plink.costSD, adj_plink, node, neighbor))
+        if sort_method == 'heap':
+            # the index is used to break ties between physical links of 
+            # equal cost, as physical links themselves cannot be ordered
+            heap = [(w, idx, t, u, v) for idx, (w, t, u, v) in enumerate(edges)]
+            heapify(heap)
+            sorted_edges = (
+                            itemgetter(0, 2, 3, 4)(heappop(heap)) 
+                            for _ in range(len(heap))
+                            )
+        elif sort_method == 'array':
+            if numpy_available:
+                # the costs are sorted in a contiguous array: a stable sort 
+                # keeps the same order as sorted for physical links of equal
+                # cost
+                costs = np.fromiter(map(itemgetter(0), edges), float, len(edges))
+                order = np.argsort(costs, kind='stable')
+                sorted_edges = map(edges.__getitem__, order.tolist())
+            else:
+                sorted_edges = sorted(edges, key=itemgetter(0))
+        else:
+            raise ValueError('Unknown sort method: {}'.format(sort_method))
+        # a spanning tree has exactly V - 1 physical links: once they are all
+        # found, the remaining physical links do not need to be processed
+        remaining_plinks = len(allowed_nodes) - 1
+        for w, t, u, v in sorted_edges:
+            if remaining_plinks <= 0:
+                break
             if uf.union(u, v):
+                remaining_plinks -= 1
                 yield t
                 
     ## Linear programming algorithms
     
+    # the variables of the LP formulations are the flows on each pair of 
+    # neighbors of 'new_graph', in iteration order. The incidence matrix has
+    # a row per node, with 1 for the variables that leave the node and -1 
+    # for the variables that enter it; it is built in one shot with numpy
+    # from the index of both ends of each variable.
+    def incidence_matrix(self, new_graph):
+        node_index = {node: idx for idx, node in enumerate(new_graph)}
+        tails = [node_index[node] for node in new_graph for _ in new_graph[node]]
+        heads = [
+                 node_index[neighbor] 
+                 for node in new_graph 
+                 for neighbor in new_graph[node]
+                 ]
+        variables = np.arange(len(tails))
+        incidence = np.zeros((len(new_graph), len(tails)))
+        incidence[tails, variables] = 1.
+        incidence[heads, variables] = -1.
+        return incidence, node_index
+    
     ## 1) Shortest path
     
     def LP_SP_formulation(self, s, t):
@@ -1139,42 +1696,33 @@ class Network(Graph):
         new_graph = {node: {} for node in self.nodes.values()}
         for node in self.nodes.values():
             for neighbor, plink in self.graph[node.id]['plink']:
-                sd = (node == plink.source)*'SD' or 'DS'
-                new_graph[node][neighbor] = getattr(plink, 'cost' + sd)
+                new_graph[node][neighbor] = plink('cost', node)
 
-        n = 2*len(self.plinks)
-        
-        c = []
-        for node in new_graph:
-            for neighbor, cost in new_graph[node].items():
-                # the float conversion is ESSENTIAL !
-                # I first forgot it, then spent hours trying to understand 
-                # what was wrong. If 'c' is not made of float, no explicit 
-                # error is raised, but the result is sort of random !
-                c.append(float(cost))
+        incidence, node_index = self.incidence_matrix(new_graph)
+        v, n = incidence.shape
+        
+        # the float conversion is ESSENTIAL !
+        # I first forgot it, then spent hours trying to understand 
+        # what was wrong. If 'c' is not made of float, no explicit 
+        # error is raised, but the result is sort of random !
+        c = np.array([
+                      cost 
+                      for node in new_graph 
+                      for cost in new_graph[node].values()
+                      ], dtype=float)
                 
         # for the condition 0 < x_ij < 1
         h = np.concatenate([np.ones(n), np.zeros(n)])
         id = np.eye(n, n)
-        G = np.concatenate((id, -1*id), axis=0).tolist()  
-        
-        # flow conservation: Ax = b
-        A, b = [], []
-        for node_r in new_graph:
-            if node_r != t:
-                b.append(float(node_r == s))
-                row = []
-                for node in new_graph:
-                    for neighbor in new_graph[node]:
-                        row.append(
-                                   -1. if neighbor == node_r 
-                              else  1. if node == node_r 
-                              else  0.
-                                   )
-                A.append(row)
+        G = np.concatenate((id, -1*id), axis=0)
+        
+        # flow conservation: Ax = b, for all nodes but the target
+        rows = np.arange(v) != node_index[t]
+        A = incidence[rows]
+        b = (np.arange(v) == node_index[s])[rows].astype(float)
         
         A, G, b, c, h = map(matrix, (A, G, b, c, h))
-        solsta, x = glpk.ilp(c, G.T, h, A.T, b)
+        solsta, x = glpk.ilp(c, G, h, A, b)
         
         # update the resulting flow for each node
         cpt = 0
@@ -1215,39 +1763,30 @@ class Network(Graph):
         new_graph = {node: {} for node in self.nodes.values()}
         for node in self.nodes.values():
             for neighbor, plink in self.graph[node.id]['plink']:
-                sd = (node == plink.source)*'SD' or 'DS'
-                new_graph[node][neighbor] = getattr(plink, 'capacity' + sd)
+                new_graph[node][neighbor] = plink('capacity', node)
 
-        n = 2*len(self.plinks)
-        v = len(new_graph)
+        incidence, node_index = self.incidence_matrix(new_graph)
+        v, n = incidence.shape
 
-        c, h = [], []
-        for node in new_graph:
-            for neighbor, capacity in new_graph[node].items():
-                c.append(float(node == s))
-                h.append(float(capacity))
+        # we maximize the flow leaving the source
+        c = (incidence[node_index[s]] == 1).astype(float)
+        h = np.array([
+                      capacity 
+                      for node in new_graph 
+                      for capacity in new_graph[node].values()
+                      ], dtype=float)
                 
-        # flow conservation: Ax = b
-        A = []
-        for node_r in new_graph:
-            if node_r not in (s, t):
-                row = []
-                for node in new_graph:
-                    for neighbor in new_graph[node]:
-                        row.append(
-                                   1. if neighbor == node_r 
-                             else -1. if node == node_r 
-                              else 0.
-                                   )
-                A.append(row)
+        # flow conservation: Ax = b, for all nodes but the source and target
+        rows = ~np.isin(np.arange(v), (node_index[s], node_index[t]))
+        A = -incidence[rows]
                 
         b = np.zeros(v - 2)
         h = np.concatenate([h, np.zeros(n)])
         x = np.eye(n, n)
-        G = np.concatenate((x, -1*x), axis=0).tolist()   
+        G = np.concatenate((x, -1*x), axis=0)
              
         A, G, b, c, h = map(matrix, (A, G, b, c, h))
-        solsta, x = glpk.ilp(-c, G.T, h, A.T, b)
+        solsta, x = glpk.ilp(-c, G, h, A, b)
 
         # update the resulting flow for each node
         cpt = 0
@@ -1262,10 +1801,7 @@ class Network(Graph):
             plink.flowSD = new_graph[src][dest]
             plink.flowDS = new_graph[dest][src]
 
-        return sum(
-                   getattr(adj, 'flow' + ((s==adj.source)*'SD' or 'DS')) 
-                   for _, adj in self.graph[s.id]['plink']
-                   )
+        return sum(adj('flow', s) for _, adj in self.graph[s.id]['plink'])
                    
     ## 3) Single-source single-destination minimum-cost flow
                
@@ -1284,36 +1820,28 @@ class Network(Graph):
                 new_graph[node][neighbor] = (plink('capacity', node),
                                              plink('cost', node))
 
-        n = 2*len(self.plinks)
-        v = len(new_graph)
+        incidence, node_index = self.incidence_matrix(new_graph)
+        v, n = incidence.shape
 
-        c, h = [], []
-        for node in new_graph:
-            for neighbor, (capacity, cost) in new_graph[node].items():
-                c.append(float(cost))
-                h.append(float(capacity))
+        capacities, costs = zip(*(
+                                  values 
+                                  for node in new_graph 
+                                  for values in new_graph[node].values()
+                                  ))
+        c = np.array(costs, dtype=float)
+        h = np.array(capacities, dtype=float)
                 
-        # flow conservation: Ax = b
-        A, b = [], []
-        for node_r in new_graph:
-            if node_r != t:
-                b.append(flow * float(node_r == s))
-                row = []
-                for node in new_graph:
-                    for neighbor in new_graph[node]:
-                        row.append(
-                                   -1. if neighbor == node_r 
-                              else  1. if node == node_r 
-                              else  0.
-                                   )
-                A.append(row)
+        # flow conservation: Ax = b, for all nodes but the target
+        rows = np.arange(v) != node_index[t]
+        A = incidence[rows]
+        b = flow * (np.arange(v) == node_index[s])[rows].astype(float)
                 
         h = np.concatenate([h, np.zeros(n)])
         x = np.eye(n, n)
-        G = np.concatenate((x, -1*x), axis=0).tolist() 
+        G = np.concatenate((x, -1*x), axis=0)
                
         A, G, b, c, h = map(matrix, (A, G, b, c, h))
-        solsta, x = glpk.ilp(c, G.T, h, A.T, b)
+        solsta, x = glpk.ilp(c, G, h, A, b)
 
         # update the resulting flow for each node
         cpt = 0
@@ -1328,10 +1856,7 @@ class Network(Graph):
             plink.flowSD = new_graph[src][dest]
             plink.flowDS = new_graph[dest][src]
 
-        return sum(
-                   getattr(adj, 'flow' + ((s==adj.source)*'SD' or 'DS')) 
-                   for _, adj in self.graph[s.id]['plink']
-                   )
+        return sum(adj('flow', s) for _, adj in self.graph[s.id]['plink'])
                    
     ## 4) K Link-disjoint shortest pair 
     
@@ -1351,62 +1876,43 @@ class Network(Graph):
             graph_K = {node: {} for node in self.nodes.values()}
             for node in graph_K:
                 for neighbor, plink in self.graph[node.id]['plink']:
-                    sd = (node == plink.source)*'SD' or 'DS'
-                    graph_K[node][neighbor] = getattr(plink, 'cost' + sd)
+                    graph_K[node][neighbor] = plink('cost', node)
             all_graph.append(graph_K)
 
-        n = 2*len(self.plinks)
-        
-        c = []
-        for graph_K in all_graph:
-            for node in graph_K:
-                for neighbor, cost in graph_K[node].items():
-                    c.append(float(cost))
+        incidence, node_index = self.incidence_matrix(all_graph[0])
+        v, n = incidence.shape
+        
+        c = np.array([
+                      cost 
+                      for graph_K in all_graph 
+                      for node in graph_K 
+                      for cost in graph_K[node].values()
+                      ], dtype=float)
                 
         # for the condition 0 < x_ij < 1
         h = np.concatenate([np.ones(K * n), np.zeros(K * n), np.ones(K * (K - 1) * n)])
         
-        G2 = []
-        for i in range(K):
-            for j in range(K):
-                if i != j:
-                    for nodeA in all_graph[j]:
-                        for neighborA in all_graph[j][nodeA]:
-                            row = []
-                            for k in range(K):
-                                for nodeB in all_graph[k]:
-                                    for neighborB in all_graph[k][nodeB]:
-                                        row.append(float(k in (i, j) and 
-                                                    nodeA == nodeB and
-                                                    neighborA == neighborB
-                                                   ))
-                            G2.append(row)
+        # for each ordered pair of paths (i, j), a physical link can be used 
+        # by at most one of them: x_i + x_j <= 1
+        G2 = np.zeros((K * (K - 1) * n, K * n))
+        pairs = ((i, j) for i in range(K) for j in range(K) if i != j)
+        for block, (i, j) in enumerate(pairs):
+            rows = slice(block * n, (block + 1) * n)
+            G2[rows, i*n:(i+1)*n] = G2[rows, j*n:(j+1)*n] = np.eye(n)
                             
         id = np.eye(K * n, K * n)
-        G = np.concatenate((id, -1*id, G2), axis=0).tolist()
+        G = np.concatenate((id, -1*id, G2), axis=0)
         
-        # flow conservation: Ax = b
-        
-        A, b = [], []
-        for i in range(K):
-            for node_r in self.nodes.values():
-                if node_r != t:
-                    row = []
-                    b.append(float(node_r == s))
-                    for j in range(K):
-                        for node in all_graph[j]:
-                            for neighbor in all_graph[j][node]:
-                                row.append(
-                                            -1. if neighbor == node_r and i == j 
-                                    else     1. if node == node_r and i == j
-                                    else     0.
-                                        )
-                    A.append(row)
+        # flow conservation: Ax = b, for each path and all nodes but the 
+        # target: the constraint matrix is block diagonal
+        rows = np.arange(v) != node_index[t]
+        A = np.kron(np.eye(K), incidence[rows])
+        b = np.tile((np.arange(v) == node_index[s])[rows].astype(float), K)
         
         A, G, b, c, h = map(matrix, (A, G, b, c, h))
         
         binvar = set(range(n))
-        solsta, x = glpk.ilp(c, G.T, h, A.T, b, B=binvar)
+        solsta, x = glpk.ilp(c, G, h, A, b, B=binvar)
         print(x)
         
         # update the resulting flow for each node
@@ -1437,16 +1943,32 @@ class Network(Graph):
     def ncr_computation(self, AS_links):
         # ct_id is the index of the congested plink bandwidth in AS_links
         # cd indicates which is the congested direction: SD or DS
-        ncr, ct_id, cd = 0, None, None
-        for idx, plink in enumerate(AS_links):
-            for direction in ('SD', 'DS'):
-                tf, cap = 'traffic' + direction, 'capacity' + direction 
-                curr_ncr = getattr(plink, tf) / getattr(plink, cap)
-                if curr_ncr > ncr:
-                    ncr = curr_ncr
-                    ct_id = idx
-                    cd = direction
-        return ncr, ct_id, cd
+        # the ratios are laid out as SD, DS, SD, DS... so that the position
+        # of the first maximum gives both the physical link and the direction
+        ratios = [
+                  ratio 
+                  for plink in AS_links 
+                  for ratio in (
+                                plink.trafficSD / plink.capacitySD, 
+                                plink.trafficDS / plink.capacityDS
+                                )
+                  ]
+        ncr = max(ratios, default=0)
+        if ncr <= 0:
+            return 0, None, None
+        ct_id, cd = divmod(ratios.index(ncr), 2)
+        return ncr, ct_id, ('SD', 'DS')[cd]
+        
+    # a cost assignment solution interleaves the SD and DS costs of the 
+    # physical links: solution[2*i] is the SD cost of AS_links[i], and 
+    # solution[2*i + 1] its DS cost
+    def cost_assignment(self, AS_links, solution):
+        for plink, costSD, costDS in zip(
+                                         AS_links, 
+                                         solution[0::2], 
+                                         solution[1::2]
+                                         ):
+            plink.costSD, plink.costDS = costSD, costDS
         
     # 2) Tabu search heuristic
                    
@@ -1464,7 +1986,10 @@ class Network(Graph):
         
         # the tabu list is an empty: it will contain all the solutions, so that
         # we don't evaluate a solution more than once (we don't go 'backward')
-        tabu_list = []
+        # solutions are stored as tuples in a set: the membership test is in
+        # constant time, and the stored solution is a snapshot that is not 
+        # affected when the current solution is modified afterwards
+        tabu_list = set()
         
         # the current optimal solution found
         best_solution = None
@@ -1486,11 +2011,11 @@ class Network(Graph):
         
         for i in range(generation_size):
             print(i)
-            curr_solution = [random.randint(1, n) for _ in range(n)]
+            # the n costs are drawn uniformly in [1, n] with a single call
+            curr_solution = random.choices(range(1, n + 1), k=n)
                 
             # we assign the costs to the physical links
-            for id, cost in enumerate(curr_solution):
-                setattr(AS_links[id//2], 'cost' + ('DS'*(id%2) or 'SD'), cost)
+            self.cost_assignment(AS_links, curr_solution)
                 
             # create the routing tables with the newly allocated costs,
             # route all traffic flows and find the network congestion ratio
@@ -1505,16 +2030,18 @@ class Network(Graph):
         for i, (_, curr_solution) in enumerate(best_candidates):
             print(i)
             
-            if curr_solution in tabu_list:
+            if tuple(curr_solution) in tabu_list:
                 continue
                 
             # we create an cost assignment and add it to the tabu list
-            tabu_list.append(curr_solution)
+            tabu_list.add(tuple(curr_solution))
             
             # we assign the costs to the physical links
-            for id, cost in enumerate(curr_solution):
-                setattr(AS_links[id//2], 'cost' + ('DS'*(id%2) or 'SD'), cost)
+            self.cost_assignment(AS_links, curr_solution)
             
+            # the traffic is routed once here: afterwards, the inner loop 
+            # below always routes it again after the last cost change, so that 
+            # the routing is up-to-date at the start of each iteration
             self.route()
             
             # if we have to look for the most congested physical link more than 
@@ -1524,8 +2051,6 @@ class Network(Graph):
             local_best_ncr = float('inf')
             
             while True:
-                self.route()
-                    
                 curr_ncr, ct_id, cd = self.ncr_computation(AS_links)
 
                 # update the best solution found if the network congestion ratio
@@ -1543,25 +2068,32 @@ class Network(Graph):
                         print(best_ncr)
                         break
                     
+                # the congested physical link, the names of its cost and 
+                # traffic in the congested direction, and the position of 
+                # that cost in the solution do not change in the loop below
+                ct_plink = AS_links[ct_id]
+                cost, traffic = 'cost' + cd, 'traffic' + cd
+                position, step = ct_id*2 + (cd == 'DS'), n // 5
+                
                 # we store the bandwidth of the physical link with the highest
                 # congestion (in the congested direction)
-                initial_bw = getattr(AS_links[ct_id], 'traffic' + cd)
+                initial_bw = getattr(ct_plink, traffic)
                     
                 # we'll increase the cost of the congested physical link, until
                 # at least one traffic is rerouted (in such a way that it will
                 # no longer use the congested physical link)
                 for k in range(5):
                     #print(k)
-                    AS_links[ct_id].__dict__['cost' + cd] += n // 5
+                    setattr(ct_plink, cost, getattr(ct_plink, cost) + step)
                     # we update the solution being evaluated and append
                     # it to the tabu list
-                    curr_solution[ct_id*2 + (cd == 'DS')] += n // 5
+                    curr_solution[position] += step
                     
-                    tabu_list.append(curr_solution)
+                    tabu_list.add(tuple(curr_solution))
                     
                     self.route()
                     
-                    new_bw = getattr(AS_links[ct_id], 'traffic' + cd)
+                    new_bw = getattr(ct_plink, traffic)
                     
                     if new_bw != initial_bw:
                         break
@@ -1569,8 +2101,7 @@ class Network(Graph):
                     C = C_max - 1
                 
 
-        for id, cost in enumerate(best_solution):
-            setattr(AS_links[id//2], 'cost' + ('DS'*(id%2) or 'SD'), cost)
+        self.cost_assignment(AS_links, best_solution)
         self.route()
         ncr, ct_id, cd = self.ncr_computation(AS_links)
         print(ncr)
@@ -1585,26 +2116,33 @@ class Network(Graph):
 
         # in the new graph, each node corresponds to a traffic path
         # we create one node per traffic physical link in the new view            
-        visited = set()
         # tl stands for traffic physical link
-        for tlA in self.traffics.values():
-            for tlB in self.traffics.values():
-                if tlB not in visited and tlA != tlB:
-                    if set(tlA.path) & set(tlB.path):
-                        nA, nB = tlA.name, tlB.name
-                        name = '{} - {}'.format(nA, nB)
-                        graph_project.network.lf(
-                                source = graph_project.network.nf(
-                                                    name = nA,
-                                                    subtype = 'optical switch'
-                                                    ),
-                                destination = graph_project.network.nf(
-                                                    name = nB,
-                                                    subtype = 'optical switch'
-                                                    ),
-                                name = name
-                                )
-            visited.add(tlA)
+        traffics = list(self.traffics.values())
+        # we index the traffics (by position) crossing each physical link, 
+        # so that we only compare traffic paths which have a physical link
+        # in common
+        crossing = defaultdict(set)
+        for idx, tl in enumerate(traffics):
+            for plink in tl.path:
+                crossing[plink].add(idx)
+        for idxA, tlA in enumerate(traffics):
+            overlapping = set().union(*(crossing[plink] for plink in tlA.path))
+            # each pair is processed once, in the order of the traffics
+            for idxB in sorted(idx for idx in overlapping if idx > idxA):
+                tlB = traffics[idxB]
+                nA, nB = tlA.name, tlB.name
+                name = '{} - {}'.format(nA, nB)
+                graph_project.network.lf(
+                        source = graph_project.network.nf(
+                                            name = nA,
+                                            subtype = 'optical switch'
+                                            ),
+                        destination = graph_project.network.nf(
+                                            name = nB,
+                                            subtype = 'optical switch'
+                                            ),
+                        name = name
+                        )
                             
         graph_project.current_view.refresh_display()
         return graph_project
@@ -1621,17 +2159,34 @@ class Network(Graph):
         optical_switch_color = dict.fromkeys(self.ftr('node', 'optical switch'), None)
         # and a list that contains all vertices that we have yet to color
         uncolored_nodes = list(optical_switch_color)
-        # we will use a function that returns the degree of a node to sort
-        # the list in ascending order
-        uncolored_nodes.sort(key = lambda node: len(self.graph[node.id]['plink']))
+        # we sort the list by ascending degree
+        graph = self.graph
+        if numpy_available:
+            # the degrees are sorted in a contiguous array: a stable sort 
+            # keeps the same order as sort for nodes of equal degree
+            degrees = np.fromiter(
+                                  (len(graph[node.id]['plink']) for node in uncolored_nodes), 
+                                  int, 
+                                  len(uncolored_nodes)
+                                  )
+            order = np.argsort(degrees, kind='stable')
+            uncolored_nodes = list(map(uncolored_nodes.__getitem__, order.tolist()))
+        else:
+            uncolored_nodes.sort(key = lambda node: len(graph[node.id]['plink']))
         # and pop nodes one by one
         while uncolored_nodes:
             largest_degree = uncolored_nodes.pop()
-            # we compute the set of colors used by adjacent vertices
-            colors = set(optical_switch_color[neighbor] for neighbor, _ in
-                                    self.graph[largest_degree.id]['plink'])
-            # we find the minimum indexed color which is available
-            min_index = [i in colors for i in range(len(colors) + 1)].index(0)
+            # we compute the colors used by adjacent vertices, as a bitmask
+            # where bit c is set if the color c is used
+            colors = 0
+            for neighbor, _ in graph[largest_degree.id]['plink']:
+                color = optical_switch_color[neighbor]
+                if color is not None:
+                    colors |= 1 << color
+            # we find the minimum indexed color which is available: 
+            # colors + 1 sets the lowest unset bit, and clears all bits 
+            # below it
+            min_index = ((colors + 1) & ~colors).bit_length() - 1
             # and assign it to the current optical switch
             optical_switch_color[largest_degree] = min_index
             
@@ -1664,53 +2219,33 @@ class Network(Graph):
         # which ensures that each optical path uses only one wavelength
         # for each path v, we must create a vector with all x_v_wl set to 1
         # for the path v, and the rest of it set to 0.
-        A = []
-        for path in range(V):
-            row = [float(K * path <= i < K * (path + 1)) for i in range(V * K)] 
-            row += [0.] * K
-            A.append(row)
+        A = np.concatenate((np.kron(np.eye(V), np.ones(K)), np.zeros((V, K))), axis=1)
             
         b = np.ones(V)
         
-        G2 = []
+        # we want to ensure that paths that have at least one physical link in 
+        # common are not assigned the same wavelength.
+        # this means that x_v_src_i + x_v_dest_i <= y_i, i.e 
+        # x_v_src_i + x_v_dest_i - y_i <= 0: for each wavelength i, there is 
+        # a block of T rows (one per physical link)
+        index = {path: idx for idx, path in enumerate(self.nodes.values())}
+        p_src = np.array([index[plink.source] for plink in self.plinks.values()], dtype=int)
+        p_dest = np.array([index[plink.destination] for plink in self.plinks.values()], dtype=int)
+        G2 = np.zeros((K * T, K * (V + 1)))
         for i in range(K):
-            for plink in self.plinks.values():
-                p_src, p_dest = plink.source, plink.destination
-                # we want to ensure that paths that have at least one physical link in 
-                # common are not assigned the same wavelength.
-                # this means that x_v_src_i + x_v_dest_i <= y_i
-                row = []
-                # vector of x_v_wl: we set x_v_src_i and x_v_dest_i to 1
-                for path in self.nodes.values():
-                    for j in range(K):
-                        row.append(float(
-                                         (path == p_src or path == p_dest)
-                                                        and
-                                                       i == j
-                                         )
-                                   )
-                # we continue filling the vector with the y_wl
-                # we want to have x_v_src_i + x_v_dest_i - y_i <= 0
-                # hence the 'minus' sign instead of float
-                for j in range(K):
-                    row.append(-float(i == j))
-                G2.append(row)
+            rows = np.arange(i * T, (i + 1) * T)
+            G2[rows, p_src * K + i] = 1
+            G2[rows, p_dest * K + i] = 1
+            G2[rows, V * K + i] = -1
         # G2 size should be K * T (rows) x K * (V + 1) (columns)
 
         # finally, we want to ensure that wavelength are used in 
         # ascending order, meaning that y_wl >= y_(wl + 1) for wl 
         # in [0, K-1]. We can rewrite it y_(wl + 1) - y_wl <= 0
-        G3 = []
-        for i in range(1, K):
-            row_wl = [float(
-                            (i == wl)
-                                or 
-                            -(i == wl + 1)
-                            )
-                        for wl in range(K)
-                      ]
-            final_row = np.concatenate([np.zeros(V * K), row_wl])
-            G3.append(final_row)
+        wl = np.arange(1, K)
+        G3 = np.zeros((K - 1, K * (V + 1)))
+        G3[wl - 1, V * K + wl] = 1
+        G3[wl - 1, V * K + wl - 1] = -1
         # G3 size should be K - 1 (rows) x K * (V + 1) (columns)
 
         h = np.concatenate([
@@ -1720,29 +2255,42 @@ class Network(Graph):
                             np.zeros(K - 1)
                             ])
 
-        G = np.concatenate((G2, G3), axis=0).tolist()
+        G = np.concatenate((G2, G3), axis=0)
         A, G, b, c, h = map(matrix, (A, G, b, c, h))
     
         binvar = set(range(K * (V + 1)))
-        solsta, x = glpk.ilp(c, G.T, h, A.T, b, B=binvar)
+        solsta, x = glpk.ilp(c, G, h, A, b, B=binvar)
         
         warnings.warn(str(int(sum(x[-K:]))))
         return int(sum(x[-K:]))
         
     ## Graph generation functions
+    
+    # the generators below go through the same nodes once per physical link:
+    # the nodes are cached by name for the duration of the generation, so 
+    # that an existing node is not looked up (and its properties updated) 
+    # by nf every time
+    def node_cache(self, subtype):
+        nodes = {}
+        def node(name):
+            if name not in nodes:
+                nodes[name] = self.nf(name=name, subtype=subtype)
+            return nodes[name]
+        return node
                 
     ## 1) Tree generation
                 
     def tree(self, n, subtype):
+        node = self.node_cache(subtype)
         for i in range(2**n-1):
             n1, n2, n3 = str(i), str(2*i+1), str(2*i+2)
-            source = self.nf(name = n1, subtype = subtype)
-            destination = self.nf(name = n2, subtype = subtype)
+            source = node(n1)
+            destination = node(n2)
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
-            source = self.nf(name = n1, subtype = subtype)
-            destination = self.nf(name = n3, subtype = subtype)
+            source = node(n1)
+            destination = node(n3)
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
@@ -1750,11 +2298,12 @@ class Network(Graph):
     ## 2) Star generation
             
     def star(self, n, subtype):
+        node = self.node_cache(subtype)
         nb_node = self.cpt_node + 1
         for i in range(n):
             n1, n2 = str(nb_node), str(nb_node+1+i)
-            source = self.nf(name = n1, subtype = subtype)
-            destination = self.nf(name = n2, subtype = subtype)
+            source = node(n1)
+            destination = node(n2)
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
@@ -1762,12 +2311,13 @@ class Network(Graph):
     ## 3) Full-meshed network generation
             
     def full_mesh(self, n, subtype):
+        node = self.node_cache(subtype)
         nb_node = self.cpt_node + 1
         for i in range(n):
             for j in range(i):
                 n1, n2 = str(nb_node+j), str(nb_node+i)
-                source = self.nf(name = n1, subtype = subtype)
-                destination = self.nf(name = n2, subtype = subtype)
+                source = node(n1)
+                destination = node(n2)
                 yield source
                 yield destination
                 yield self.lf(source=source, destination=destination)
@@ -1775,11 +2325,12 @@ class Network(Graph):
     ## 4) Ring generation
                 
     def ring(self, n, subtype):
+        node = self.node_cache(subtype)
         nb_node = self.cpt_node + 1
         for i in range(n):
             n1, n2 = str(nb_node+i), str(nb_node+(1+i)%n)
-            source = self.nf(name = n1, subtype = subtype)
-            destination = self.nf(name = n2, subtype = subtype)
+            source = node(n1)
+            destination = node(n2)
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
@@ -1787,17 +2338,18 @@ class Network(Graph):
     ## 5) Square tiling generation
             
     def square_tiling(self, n, subtype):
+        node = self.node_cache(subtype)
         for i in range(n**2):
             n1, n2, n3 = str(i), str(i-1), str(i+n)
             if i-1 > -1 and i%n:
-                source = self.nf(name = n1, subtype = subtype)
-                destination = self.nf(name = n2, subtype = subtype)
+                source = node(n1)
+                destination = node(n2)
                 yield source
                 yield destination
                 yield self.lf(source=source, destination=destination)
             if i+n < n**2:
-                source = self.nf(name = n1, subtype = subtype)
-                destination = self.nf(name = n3, subtype = subtype)
+                source = node(n1)
+                destination = node(n3)
                 yield source
                 yield destination
                 yield self.lf(source=source, destination=destination)
@@ -1818,15 +2370,20 @@ class Network(Graph):
                                            subtype = subtype
                                            )
                                    )
-            for plink in graph_plinks[:]:
+            # the physical links appended below belong to the new hypercube: 
+            # only the physical links of the previous one are iterated over,
+            # by index, without copying the list
+            for j in range(len(graph_plinks)):
                 # connection of the two hypercubes
+                plink = graph_plinks[j]
                 source, destination = plink.source, plink.destination
-                n1 = str(int(source.name) + 2**i)
-                n2 = str(int(destination.name) + 2**i)
+                # the node named 'k' is graph_nodes[k]
+                n1 = int(source.name) + 2**i
+                n2 = int(destination.name) + 2**i
                 graph_plinks.append(
                                    self.lf(
-                                           source = self.nf(name = n1), 
-                                           destination = self.nf(name = n2)
+                                           source = graph_nodes[n1], 
+                                           destination = graph_nodes[n2]
                                            )
                                    )
             for k in range(len(graph_nodes)//2):
@@ -1844,15 +2401,18 @@ class Network(Graph):
     ## 7) Generalized Kneser graph
     
     def kneser(self, n, k, subtype):
-        # we keep track of what set we've seen to avoid having
-        # duplicated edges in the graph, with the 'already_done' set
-        already_done = set()
-        for setA in map(set, combinations(range(1, n), k)):
-            already_done.add(frozenset(setA))
-            for setB in map(set, combinations(range(1, n), k)):
-                if setB not in already_done and not setA & setB:
-                    source = self.nf(name = str(setA), subtype = subtype)
-                    destination = self.nf(name = str(setB), subtype = subtype)
+        node = self.node_cache(subtype)
+        # each k-subset is encoded as a bitmask (bit x is set if x belongs 
+        # to the subset): two subsets are disjoint if their bitmasks have 
+        # no bit in common. Each pair is considered once (a < b) to avoid 
+        # having duplicated edges in the graph
+        subsets = list(map(set, combinations(range(1, n), k)))
+        masks = [sum(1 << x for x in subset) for subset in subsets]
+        for a, maskA in enumerate(masks):
+            for b in range(a + 1, len(masks)):
+                if not maskA & masks[b]:
+                    source = node(str(subsets[a]))
+                    destination = node(str(subsets[b]))
                     yield source
                     yield destination
                     yield self.lf(source=source, destination=destination)
@@ -1860,25 +2420,26 @@ class Network(Graph):
     ## 8) Generalized Petersen graph
     
     def petersen(self, n, k, subtype):
+        node = self.node_cache(subtype)
         # the petersen graph is made of the vertices (u_i) and (v_i) for 
         # i in [0, n-1] and the edges (u_i, u_i+1), (u_i, v_i) and (v_i, v_i+k).
         # to build it, we consider that v_i = u_(i+n).
         for i in range(n):
             # (u_i, u_i+1) edges
-            source = self.nf(name = str(i), subtype = subtype)
-            destination = self.nf(name = str((i + 1)%n), subtype = subtype)
+            source = node(str(i))
+            destination = node(str((i + 1)%n))
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
             # (u_i, v_i) edges
-            source = self.nf(name = str(i), subtype = subtype)
-            destination = self.nf(name = str(i+n), subtype = subtype)
+            source = node(str(i))
+            destination = node(str(i+n))
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
             # (v_i, v_i+k) edges
-            source = self.nf(name = str(i+n), subtype = subtype)
-            destination = self.nf(name = str((i+n+k)%n + n), subtype = subtype)
+            source = node(str(i+n))
+            destination = node(str((i+n+k)%n + n))
             yield source
             yield destination
             yield self.lf(source=source, destination=destination)
@@ -1956,13 +2517,19 @@ class Network(Graph):
                     cct_type = 'level-2' if l2 else 'level-1'
                     yield 'isis circuit-type ' + cct_type
             
+        # the interfaces do not depend on the AS: they are retrieved once,
+        # for all the AS the node belongs to
+        interfaces = [
+                      (adj_plink, adj_plink('interface', node))
+                      for _, adj_plink in self.graph[node.id]['plink']
+                      ]
+            
         for AS in node.AS:
             
             if AS.AS_type == 'RIP':
                 yield 'router rip'
                 
-                for _, adj_plink in self.graph[node.id]['plink']:
-                    interface = adj_plink('interface', node)
+                for adj_plink, interface in interfaces:
                     if adj_plink in AS.pAS['link']:
                         ip = interface.ip_address
                         
@@ -1974,8 +2541,7 @@ class Network(Graph):
                 
                 yield 'router ospf 1'
                 
-                for _, adj_plink in self.graph[node.id]['plink']:
-                    interface = adj_plink('interface', node)
+                for adj_plink, interface in interfaces:
                     if adj_plink in AS.pAS['link']:
                         ip = interface.ip_address
                         plink_area ,= adj_plink.AS[AS]
@@ -2027,7 +2593,7 @@ class Network(Graph):
                 # We will derive it from the router's loopback address
                     
                 AFI = '49.' + str(format(node_area.id, '04d'))
-                sid = '.'.join((format(int(n), '03d') for n in node.ip_address.split('.')))
+                sid = '.'.join([padded_bytes[int(n)] for n in node.ip_address.split('.')])
                 net = '.'.join((AFI, sid, '00'))
             
                 yield 'router isis'
@@ -819,7 +819,7 @@ class PhysicalLink(Link):
         # link directional property ('SD', 'DS')
         # these properties are used for classic algorithms such as 
         # shortest paths and flow algorithms
-        dir = (node == self.source)*'SD' or 'DS'
+        dir = 'SD' if node == self.source else 'DS'
         if not AS and property in ('flow', 'cost', 'capacity', 'traffic', 'wctraffic'):
             if value != False:
                 setattr(self, property + dir, value)
@@ -942,7 +942,7 @@ class VirtualConnection(Link):
         # whether a value is provided or not
         # if the property doesn't exist for a virtual connection, we look at
         # the equivalent property for the associated physical link
-        dir = (node == self.source)*'S' or 'D'
+        dir = 'S' if node == self.source else 'D'
         if hasattr(self, property + dir):
             if value != False:
                 setattr(self, property + dir, value)
@@ -984,7 +984,7 @@ class Route(Link):
     def __call__(self, property, node, value=None):
         # can be used both as a getter and a setter, depending on 
         # whether a value is provided or not
-        dir = (node == self.source)*'S' or 'D'
+        dir = 'S' if node == self.source else 'D'
         if value:
             setattr(self, property + dir, value)
         else:
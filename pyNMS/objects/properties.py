@@ -12,6 +12,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from ast import literal_eval
+
 # all classes have a name parameter: it is the name of the object variable
 # all classes have a "pretty name": the name of the property when displayed
 # in the GUI.
@@ -70,7 +72,7 @@ class ListProperty(list, Property):
     
     def __new__(cls, values=None):
         if isinstance(values, str):
-            values = eval(values)
+            values = literal_eval(values)
         cls.values = values
         return values
         
@@ -82,7 +84,7 @@ class SetProperty(set, Property):
     
     def __new__(cls, values=None):
         if isinstance(values, str):
-            values = eval(values)
+            values = literal_eval(values)
         cls.values = values
         return values
         
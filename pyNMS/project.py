@@ -215,16 +215,18 @@ class Project(QWidget):
             # nodes and links import
             if name in all_subtypes:
                 properties = sheet.row_values(0)
+                # the factory is selected once per sheet, not once per row
+                if name == 'site':
+                    factory = self.site_view.network.nf
+                elif name in node_subtype:
+                    factory = self.network_view.network.nf
+                else:
+                    factory = self.network_view.network.lf
+                mass_objectizer = self.network.mass_objectizer
                 for row in range(1, sheet.nrows):
                     values = sheet.row_values(row)
-                    kwargs = self.network.mass_objectizer(properties, values)
-                    if name in node_subtype:
-                        if name == 'site':
-                            self.site_view.network.nf(subtype=name, **kwargs)
-                        else:
-                            self.network_view.network.nf(subtype=name, **kwargs)
-                    if name in link_subtype: 
-                        self.network_view.network.lf(subtype=name, **kwargs)
+                    kwargs = mass_objectizer(properties, values)
+                    factory(subtype=name, **kwargs)
                 
             # interface import
             elif name in ('ethernet interface', 'optical interface'):
@@ -1,4 +1,5 @@
 from collections import defaultdict
+from contextlib import contextmanager
 from graphical_objects.graphical_node import GraphicalNode
 from graphical_objects.graphical_link import GraphicalLink
 from graphical_objects.graphical_text import GraphicalText
@@ -13,6 +14,10 @@ from PyQt5.QtWidgets import *
 
 class BaseView(QGraphicsView):
     
+    # one pen per link subtype, created once at class level and shared by all
+    # views and all graphical links: links must only ever set these pens (or
+    # the selection pen), never build their own, so that drawing thousands of
+    # links does not allocate thousands of QPen objects
     link_color = {
     'ethernet link': QPen(QColor(0, 0, 255), 3),
     'optical link': QPen(QColor(212, 34, 42), 3),
@@ -41,8 +46,14 @@ class BaseView(QGraphicsView):
         self.subtypes = dict.fromkeys(all_subtypes, None)
         # per-mode selection (nodes, links, shapes)
         self.selection = dict.fromkeys(self.controller.selection_panel.modes, True)
+        # link selection mode, kept as an attribute as it is read by every
+        # graphical link at creation: it must be updated along with selection
+        self.link_selectable = self.selection['link']
         # set of shapes
         self.shapes = set()
+        # set of graphical links to update at the end of a bulk move
+        # (None when no bulk move is in progress)
+        self.moved_glinks = None
         
     ## Useful functions
     
@@ -85,6 +96,31 @@ class BaseView(QGraphicsView):
     def filter(self, type, *subtypes):
         return self.get_items(self.network.ftr(type, *subtypes))
         
+    ## Bulk move of nodes
+    
+    # the nodes moved inside this context have their attached links updated
+    # only once, when all nodes have reached their new position
+    @contextmanager
+    def bulk_move(self):
+        self.moved_glinks = set()
+        try:
+            yield
+        finally:
+            glinks, self.moved_glinks = self.moved_glinks, None
+            GraphicalLink.bulk_update_positions(glinks)
+        
+    # the scene index is disabled while items are inserted in bulk, and 
+    # rebuilt once at the end instead of being updated at each insertion.
+    # the previous index method is restored, so that nested calls are fine
+    @contextmanager
+    def bulk_item_insertion(self):
+        index_method = self.scene.itemIndexMethod()
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        try:
+            yield
+        finally:
+            self.scene.setItemIndexMethod(index_method)
+        
     ## Zoom system
 
     def zoom_in(self):
@@ -175,8 +211,9 @@ class BaseView(QGraphicsView):
     def align(self, nodes, horizontal=True):
         # alignment can be either horizontal (h is True) or vertical
         minimum = min(node.y if horizontal else node.x for node in nodes)
-        for node in nodes:
-            setattr(node, 'y'*horizontal or 'x', minimum)
+        with self.bulk_move():
+            for node in nodes:
+                setattr(node, 'y'*horizontal or 'x', minimum)
             
     def distribute(self, nodes, horizontal=True):
         # uniformly distribute the nodes between the minimum and
@@ -186,8 +223,9 @@ class BaseView(QGraphicsView):
         # we'll use a sorted list to keep the same order after distribution
         nodes = sorted(nodes, key=lambda n: getattr(n, 'x'*horizontal or 'y'))
         offset = (maximum - minimum)/(len(nodes) - 1)
-        for idx, node in enumerate(nodes):
-            setattr(node, 'x'*horizontal or 'y', minimum + idx*offset)
+        with self.bulk_move():
+            for idx, node in enumerate(nodes):
+                setattr(node, 'x'*horizontal or 'y', minimum + idx*offset)
             
     ## Selection of objects
     
@@ -13,13 +13,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import OrderedDict
-from os.path import join
+from os.path import getmtime, join
 from .base_view import BaseView
 from math import asin, cos, radians, sin, sqrt
 try:
+    import numpy as np
     import shapefile
     import shapely.geometry
     from pyproj import Proj
+    # shapely 2 has vectorized functions working on arrays of geometries
+    vectorized_shapely = hasattr(shapely, 'get_coordinates')
 except ImportError as e:
     import warnings
     warnings.warn(str(e))
@@ -56,8 +59,12 @@ class GeographicalView(BaseView):
         self.world_map = Map(self)
                             
     def update_geographical_coordinates(self, *gnodes):
-        for gnode in gnodes:
-            lon, lat = self.world_map.to_geographical_coordinates(gnode.x, gnode.y)
+        # all nodes are projected back with a single call
+        lons, lats = self.world_map.to_geographical_coordinates(
+                                        np.array([gnode.x for gnode in gnodes]), 
+                                        np.array([gnode.y for gnode in gnodes])
+                                        )
+        for gnode, lon, lat in zip(gnodes, lons.tolist(), lats.tolist()):
             gnode.node.longitude, gnode.node.latitude = lon, lat
             
     def update_logical_coordinates(self, *gnodes):
@@ -67,17 +74,22 @@ class GeographicalView(BaseView):
     def move_to_geographical_coordinates(self, *gnodes):
         if not gnodes:
             gnodes = self.all_gnodes()
-        for gnode in gnodes:
-            gnode.x, gnode.y = self.world_map.to_canvas_coordinates(
-                                    gnode.node.longitude, 
-                                    gnode.node.latitude
-                                    )
+        gnodes = list(gnodes)
+        # all nodes are projected with a single call
+        xs, ys = self.world_map.to_canvas_coordinates(
+                                np.array([gnode.node.longitude for gnode in gnodes]), 
+                                np.array([gnode.node.latitude for gnode in gnodes])
+                                )
+        with self.bulk_move():
+            for gnode, x, y in zip(gnodes, xs.tolist(), ys.tolist()):
+                gnode.x, gnode.y = x, y
         
     def move_to_logical_coordinates(self, *gnodes):
         if not gnodes:
             gnodes = self.all_gnodes()
-        for gnode in gnodes:
-            gnode.x, gnode.y = gnode.node.logical_x, gnode.node.logical_y
+        with self.bulk_move():
+            for gnode in gnodes:
+                gnode.x, gnode.y = gnode.node.logical_x, gnode.node.logical_y
         
     def haversine_distance(self, s, d):
         coord = (s.longitude, s.latitude, d.longitude, d.latitude)
@@ -93,34 +105,71 @@ class GeographicalView(BaseView):
         r = 6371 
         
         return c*r
+        
+    # distances between sources[i] and destinations[i] for all i, computed 
+    # at once on numpy arrays (same formula as haversine_distance)
+    def haversine_distances(self, sources, destinations):
+        lon_s, lat_s, lon_d, lat_d = np.radians([
+                    [s.longitude for s in sources], 
+                    [s.latitude for s in sources], 
+                    [d.longitude for d in destinations], 
+                    [d.latitude for d in destinations]
+                    ])
+    
+        delta_lon = lon_d - lon_s 
+        delta_lat = lat_d - lat_s 
+        a = np.sin(delta_lat/2)**2 + np.cos(lat_s)*np.cos(lat_d)*np.sin(delta_lon/2)**2
+        c = 2*np.arcsin(np.sqrt(a))
+        
+        return c*6371
                 
 class Map():
 
+    # the projections are defined by their PROJ string: the Proj objects are
+    # only created when a projection is used for the first time, and shared
+    # by all maps
     projections = OrderedDict([
-    ('Spherical', Proj('+proj=ortho +lat_0=48 +lon_0=17')),
-    ('Mercator', Proj(init='epsg:3395')),
-    ('WGS84', Proj(init='epsg:3857')),
-    ('ETRS89 - LAEA Europe', Proj("+init=EPSG:3035"))
+    ('Spherical', '+proj=ortho +lat_0=48 +lon_0=17'),
+    ('Mercator', '+init=epsg:3395'),
+    ('WGS84', '+init=epsg:3857'),
+    ('ETRS89 - LAEA Europe', '+init=EPSG:3035')
     ])
     
+    projectors = {}
+    
     def __init__(self, view):
         self.view = view
         self.proj = 'Spherical'
         self.ratio, self.offset = 1/1000, (0, 0)
         self.display = True
         self.polygons = self.view.scene.createItemGroup([])
+        # tolerance (in degrees) used to simplify the shapefile polygons 
+        # before they are projected: every vertex closer than this from the
+        # simplified outline is dropped. 0 disables the simplification.
+        # Shapes with few vertices are drawn as they are.
+        self.simplification = 0.01
+        self.simplification_threshold = 50
+        self.lands_cache = {}
         
         # brush for water and lands
         self.water_brush = QBrush(QColor(64, 164, 223))
         self.land_brush = QBrush(QColor(52, 165, 111))
         self.land_pen = QPen(QColor(52, 165, 111))
 
+    def projector(self):
+        if self.proj not in self.projectors:
+            self.projectors[self.proj] = Proj(self.projections[self.proj])
+        return self.projectors[self.proj]
+
+    # like to_canvas_coordinates, works on numbers or numpy arrays
     def to_geographical_coordinates(self, x, y):
         px, py = (x - self.offset[0])/self.ratio, (self.offset[1] - y)/self.ratio
-        return self.projections[self.proj](px, py, inverse=True)
+        return self.projector()(px, py, inverse=True)
         
+    # longitude and latitude can be numbers, or numpy arrays of coordinates 
+    # to project several points with a single call
     def to_canvas_coordinates(self, longitude, latitude):
-        px, py = self.projections[self.proj](longitude, latitude)
+        px, py = self.projector()(longitude, latitude)
         return px*self.ratio + self.offset[0], -py*self.ratio + self.offset[1]
                 
     def draw_water(self):
@@ -145,29 +194,114 @@ class Map():
             earth_water.setBrush(self.water_brush)
             self.polygons.addToGroup(earth_water)
             
-    def draw_polygons(self):
-        sf = shapefile.Reader(self.shapefile)       
-        polygons = sf.shapes() 
-        for polygon in polygons:
-            # convert shapefile geometries into shapely geometries
-            # to extract the polygons of a multipolygon
+    # the shapefile geometries are converted into shapely geometries to 
+    # extract the polygons of a multipolygon: both functions below return 
+    # the geographical coordinates of the exterior of all polygons, as an 
+    # array of (longitude, latitude) points, the index of the polygon each
+    # point belongs to, and the number of polygons.
+    # With shapely 2, all geometries are processed at once as arrays
+    def lands(self, shapes):
+        geometries = np.empty(len(shapes), dtype=object)
+        geometries[:] = [shapely.geometry.shape(shape) for shape in shapes]
+        if self.simplification:
+            sizes = np.array([len(shape.points) for shape in shapes])
+            simplify = np.flatnonzero(sizes > self.simplification_threshold)
+            # topology is not preserved (it is much faster): if a whole 
+            # shape collapses, the original shape is kept
+            simplified = shapely.simplify(
+                                          geometries[simplify], 
+                                          self.simplification, 
+                                          preserve_topology = False
+                                          )
+            collapsed = shapely.is_empty(simplified)
+            geometries[simplify[~collapsed]] = simplified[~collapsed]
+        polygons = shapely.get_parts(geometries)
+        # parts of a multipolygon may collapse when it is simplified
+        polygons = polygons[~shapely.is_empty(polygons)]
+        coords, index = shapely.get_coordinates(
+                                                shapely.get_exterior_ring(polygons), 
+                                                return_index = True
+                                                )
+        return coords, index, len(polygons)
+            
+    def lands_per_shape(self, shapes):
+        exteriors = []
+        for polygon in shapes:
+            simplify = (
+                        self.simplification and 
+                        len(polygon.points) > self.simplification_threshold
+                        )
             polygon = shapely.geometry.shape(polygon)
+            if simplify:
+                simplified = polygon.simplify(
+                                              self.simplification, 
+                                              preserve_topology = False
+                                              )
+                if not simplified.is_empty:
+                    polygon = simplified
             # if it is a polygon, we use a list to make it iterable
             if polygon.geom_type == 'Polygon':
                 polygon = [polygon]
+            else:
+                polygon = polygon.geoms
             for land in polygon:
-                qt_polygon = QtGui.QPolygonF() 
-                longitudes, latitudes = land.exterior.coords.xy
-                for lon, lat in zip(longitudes, latitudes):
-                    px, py = self.to_canvas_coordinates(lon, lat)
-                    if px > 1e+10:
-                        continue
-                    qt_polygon.append(QtCore.QPointF(px, py))
-                polygon_item = QtWidgets.QGraphicsPolygonItem(qt_polygon)
-                polygon_item.setBrush(self.land_brush)
-                polygon_item.setPen(self.land_pen)
-                polygon_item.setZValue(1)
-                yield polygon_item
+                if not land.is_empty:
+                    exteriors.append(np.column_stack(land.exterior.coords.xy))
+        sizes = [len(exterior) for exterior in exteriors]
+        index = np.repeat(np.arange(len(exteriors)), sizes)
+        coords = np.concatenate(exteriors) if exteriors else np.empty((0, 2))
+        return coords, index, len(exteriors)
+        
+    # the geographical coordinates do not depend on the projection or the 
+    # ratio: they are kept for the last shapefile, so that the map can be 
+    # redrawn without reading and converting the shapefile again
+    def geographical_lands(self):
+        key = (
+               self.shapefile, 
+               getmtime(self.shapefile), 
+               self.simplification, 
+               self.simplification_threshold
+               )
+        if key not in self.lands_cache:
+            shapes = shapefile.Reader(self.shapefile).shapes()
+            if vectorized_shapely:
+                self.lands_cache = {key: self.lands(shapes)}
+            else:
+                self.lands_cache = {key: self.lands_per_shape(shapes)}
+        return self.lands_cache[key]
+            
+    # all lands are drawn as a single path item: the scene has one item to
+    # paint and hit-test instead of one item per polygon
+    def draw_polygons(self):
+        coords, index, nb_polygons = self.geographical_lands()
+        # all vertices are projected with a single call, then split by polygon
+        xs, ys = self.to_canvas_coordinates(coords[:, 0], coords[:, 1])
+        # the points that cannot be projected (e.g. the other side of the 
+        # earth with the spherical projection) are filtered out at once
+        visible = ~(xs > 1e+10)
+        xs, ys, index = xs[visible].tolist(), ys[visible].tolist(), index[visible]
+        bounds = np.searchsorted(index, np.arange(nb_polygons + 1)).tolist()
+        path = QtGui.QPainterPath()
+        # all exterior rings have the same orientation: with the winding rule,
+        # polygons that overlap after the simplification do not create holes
+        path.setFillRule(Qt.WindingFill)
+        for start, end in zip(bounds, bounds[1:]):
+            # polygons that are entirely hidden are not added to the path
+            if start == end:
+                continue
+            # the polygon is built from the list of all its points at once
+            qt_polygon = QtGui.QPolygonF(list(map(
+                                                  QtCore.QPointF, 
+                                                  xs[start:end], 
+                                                  ys[start:end]
+                                                  )))
+            path.addPolygon(qt_polygon)
+            path.closeSubpath()
+        lands_item = QtWidgets.QGraphicsPathItem(path)
+        lands_item.setBrush(self.land_brush)
+        lands_item.setPen(self.land_pen)
+        lands_item.setZValue(1)
+        return lands_item
                 
     def show_hide_map(self):
         self.display = not self.display
@@ -178,7 +312,7 @@ class Map():
             
     def redraw_map(self):
         self.delete_map()
-        self.polygons = self.view.scene.createItemGroup(self.draw_polygons())
+        self.polygons = self.view.scene.createItemGroup([self.draw_polygons()])
         self.draw_water()
         # replace the nodes at their geographical location
         self.view.move_to_geographical_coordinates()
@@ -26,14 +26,21 @@ class MainNetworkView(GeographicalView, NetworkView):
             yield link.glink[self]
         
     def draw_objects(self, *objects):
-        for obj in objects:
-            if obj.class_type == 'node' and self not in obj.gnode:
-                GraphicalNetworkNode(self, obj)
-            if obj.class_type == 'link' and self not in obj.glink:
-                if 'vc' in obj.subtype:
-                    continue
-                self.draw_objects(obj.source, obj.destination)
-                GraphicalLink(self, obj)
+        # graphical links are added to the scene in a single pass, once all
+        # objects have been drawn
+        new_glinks = []
+        with self.bulk_item_insertion():
+            for obj in objects:
+                if obj.class_type == 'node' and self not in obj.gnode:
+                    GraphicalNetworkNode(self, obj)
+                if obj.class_type == 'link' and self not in obj.glink:
+                    if 'vc' in obj.subtype:
+                        continue
+                    self.draw_objects(obj.source, obj.destination)
+                    glink = GraphicalLink(self, obj, add_to_scene=False)
+                    new_glinks.append(glink)
+            for glink in new_glinks:
+                self.scene.addItem(glink)
         
     def dropEvent(self, event):
         pos = self.mapToScene(event.pos())
@@ -143,8 +143,9 @@ class NetworkView(BaseView):
             nodeA.vx = max(-100, min(100, 0.5 * nodeA.vx + 0.2 * Fx))
             nodeA.vy = max(-100, min(100, 0.5 * nodeA.vy + 0.2 * Fy))
     
-        for node in self.node_selection:
-            node.x, node.y = node.x + node.vx*sf, node.y + node.vy*sf
+        with self.bulk_move():
+            for node in self.node_selection:
+                node.x, node.y = node.x + node.vx*sf, node.y + node.vy*sf
             
     ## 2) Fruchterman-Reingold algorithm
     
@@ -181,10 +182,11 @@ class NetworkView(BaseView):
                 link.destination.gnode[self].vx += distance*dx/opd
                 link.destination.gnode[self].vy += distance*dy/opd
             
-        for node in self.node_selection:
-            distance = self.distance(node.vx, node.vy)
-            node.x += node.vx/sqrt(distance)
-            node.y += node.vy/sqrt(distance)
+        with self.bulk_move():
+            for node in self.node_selection:
+                distance = self.distance(node.vx, node.vy)
+                node.x += node.vx/sqrt(distance)
+                node.y += node.vy/sqrt(distance)
             
         t *= 0.95
         
@@ -212,7 +214,8 @@ class NetworkView(BaseView):
     ## Drawing functions
         
     def random_layout(self):
-        for gnode in self.node_selection:
-            gnode.x = randint(int(gnode.x) - 500, int(gnode.x) + 500)
-            gnode.y = randint(int(gnode.y) - 500, int(gnode.y) + 500)
+        with self.bulk_move():
+            for gnode in self.node_selection:
+                gnode.x = randint(int(gnode.x) - 500, int(gnode.x) + 500)
+                gnode.y = randint(int(gnode.y) - 500, int(gnode.y) + 500)
         
\ No newline at end of file